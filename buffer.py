@@ -1,5 +1,6 @@
 """The buffer module assists in iterating through lines and tokens."""
 
+import collections
 import math
 
 class Buffer:
@@ -16,8 +17,15 @@ class Buffer:
     In addition, Buffer provides a current method to look at the
     next item to be supplied, without sequencing past it.
 
-    The __str__ method prints all tokens read so far, up to the end of the
-    current line, and marks the current token with >>.
+    The __str__ method prints the last few lines of tokens read so far, up to
+    the end of the current line, and marks the current token with >>.  Only
+    those lines are kept, so a Buffer over a long source uses little memory.
+
+    The position property is the (line, column) of the current token, where
+    lines count from 1 and columns from 0.  Lines are numbered from the
+    line_number attribute of the source, if any, and the column is the
+    character offset given by the source's columns method, or None for a
+    source without one.
 
     >>> buf = Buffer(iter([['(', '+'], [15], [12, ')']]))
     >>> buf.pop()
@@ -29,6 +37,8 @@ class Buffer:
     >>> print(buf)
     1: ( +
     2:  >> 15
+    >>> buf.position
+    (2, None)
     >>> buf.pop()
     15
     >>> buf.current()
@@ -49,9 +59,11 @@ class Buffer:
     """
     def __init__(self, source):
         self.index = 0
-        self.lines = []
+        self.lines = collections.deque(maxlen=4)
+        self.line_number = getattr(source, 'line_number', 0)
         self.source = source
         self.current_line = ()
+        self.columns = None
         self.current()
 
     def pop(self):
@@ -61,6 +73,16 @@ class Buffer:
         self.index += 1
         return current
 
+    @property
+    def position(self):
+        if self.columns is None and self.more_on_line:
+            columns = getattr(self.source, 'columns', None)
+            if columns is None:
+                return (self.line_number, None)
+            self.columns = columns()
+        column = self.columns[self.index] if self.more_on_line else None
+        return (self.line_number, column)
+
     @property
     def more_on_line(self):
         return self.index < len(self.current_line)
@@ -71,7 +93,9 @@ class Buffer:
             self.index = 0
             try:
                 self.current_line = next(self.source)
+                self.columns = None
                 self.lines.append(self.current_line)
+                self.line_number += 1
             except StopIteration:
                 self.current_line = ()
                 return None
@@ -80,13 +104,14 @@ class Buffer:
     def __str__(self):
         """Return recently read contents; current element marked with >>."""
         # Format string for right-justified line numbers
-        n = len(self.lines)
+        n = self.line_number
         msg = '{0:>' + str(math.floor(math.log10(n))+1) + "}: "
 
         # Up to three previous lines and current line are included in output
         s = ''
-        for i in range(max(0, n-4), n-1):
-            s += msg.format(i+1) + ' '.join(map(str, self.lines[i])) + '\n'
+        first = n - len(self.lines) + 1
+        for i in range(len(self.lines) - 1):
+            s += msg.format(first+i) + ' '.join(map(str, self.lines[i])) + '\n'
         s += msg.format(n)
         s += ' '.join(map(str, self.current_line[:self.index]))
         s += ' >> '
@@ -110,15 +135,17 @@ class InputReader:
             self.prompt = ' ' * len(self.prompt)
 
 class LineReader:
-    """A LineReader is an iterable that prints lines after a prompt."""
+    """A LineReader is an iterable that prints lines after a prompt.  LINES
+    may be any iterable of strings; LineReaders that share an iterator over
+    them, such as an open file, continue where the last one stopped."""
     def __init__(self, lines, prompt, comment=";"):
-        self.lines = lines
+        self.lines = iter(lines)
         self.prompt = prompt
         self.comment = comment
 
     def __iter__(self):
-        while self.lines:
-            line = self.lines.pop(0).strip('\n')
+        for line in self.lines:
+            line = line.strip('\n')
             if (self.prompt is not None and line != "" and
                 not line.lstrip().startswith(self.comment)):
                 print(self.prompt + line)
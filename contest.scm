@@ -32,14 +32,17 @@
 
 ;;; Render a function f, that outputs colors given screen coords as input
 ;;; to the screen using the turtle.
+;;; Pixels come from the stream of coordinates in scanline order.
 (define (render-function f width height)
-  (let iter-xy ((x 0) (y 0))
-    (cond ((= y height) 'done)
-          ((= x width) (linefeed width) (iter-xy 0 (inc y)))
-          (else (pendown)
-                (color (f x y))
-                (right 1)
-                (iter-xy (inc x) y)))))
+  (stream-for-each
+    (lambda (p)
+      (let ((x (car p)) (y (car (cdr p))))
+        (pendown)
+        (color (f x y))
+        (right 1)
+        (if (= x (- width 1)) (linefeed width))))
+    (coordinate-stream width height))
+  'done)
 
 ;;; Normalize screen coords to -1.0 -> 1.0 domain
 (define (normalize-screencoords x y width height)
@@ -50,103 +53,12 @@
               (vector (/ width height) -1)))
 
 ;;; Scheme Standard Collection Functions
-
-(define (find pred lst)
-  (let ((res (find-tail pred lst)))
-    (if res (car res) #f)))
-
-(define (find-tail pred lst)
-  (let recur ((lst lst))
-    (and (not (null? lst))
-	 (if (pred (car lst)) lst
-	     (recur (cdr lst))))))
-
-(define (any-empty? lists)
-  (if (find null? lists) #t #f))
-
-(define (cdrs lists)
-  (if (any-empty? lists) '()
-      (map1 cdr lists)))
-
-(define (cars lists)
-  (if (any-empty? lists) '()
-      (map1 car lists)))
-
-(define (cars+ lists last-elm)
-  (if (pair? lists)
-      (cons (caar lists)
-            (cars+ (cdr lists) last-elm))
-      (list last-elm)))
-
-(define (cars+cdrs lists)
-  (if (any-empty? lists) '()
-      (list (map1 car lists)
-            (map1 cdr lists))))
-
-(define (fold-left1 kons knil lst)
-  (if (null? lst) knil
-      (fold-left1 kons
-             (kons (car lst) knil)
-             (cdr lst))))
-
-(define (fold-left-many kons knil lists)
-  (if (any-empty? lists) knil
-      (let ((items (cars+ lists knil))
-            (rest (cdrs lists)))
-        (fold-left-many kons
-              (apply kons items)
-              rest))))
-
-(define (fold-left kons knil lst . lists)
-  (if (pair? lists)
-      (fold-left-many kons knil (cons lst lists))
-      (fold-left1 kons knil lst)))
-
-(define (fold-right kons knil lst . lists)
-  (if (pair? lists)
-      (let recur ((lists (cons lst lists)))
-        (let ((cdrs (cdrs lists)))
-             (if (null? cdrs) knil
-                 (apply kons (cars+ lists (recur cdrs))))))
-      (let recur ((lst lst))
-        (if (null? lst) knil
-            (let ((head (car lst)))
-              (kons head (recur (cdr lst))))))))
-
-(define (map1 f lst)
-  (if (null? lst) '()
-      (cons (f (car lst)) (map1 f (cdr lst)))))
-
-(define (map f lst . lists)
-  (apply fold-right
-         (cons (lambda (x y) (cons (f x) y)) (cons '() (cons lst lists)))))
-
-(define (reduce f lst)
-  (fold-left f (car lst) (cdr lst)))
-
-(define (vector-map! f vec . vecs)
-  (let recur ((index 0)
-              (len (vector-length vec))
-              (vecs (cons vec vecs)))
-    (if (= index len) vec
-        (begin (vector-set! vec index
-                            (apply f (apply map (list (lambda (vec)
-                                                        (vector-ref vec index))
-                                                      vecs))))
-               (recur (inc index) len vecs)))))
-
-(define (vector-map f vec . vecs)
-  (apply vector-map! (cons f (cons (vector-copy vec) vecs))))
+;;; (map, fold-left, fold-right, reduce, find, min, max and vector-map are
+;;; primitives)
 
 (define (inc x) (+ x 1))
 (define (dec x) (- x 1))
 
-(define (min . xs)
-  (reduce (lambda (x y) (if (< x y) x y)) xs))
-
-(define (max . xs)
-  (reduce (lambda (x y) (if (> x y) x y)) xs))
-
 ;;; Vectors
 ;;; =======
 ;;;
@@ -415,11 +327,15 @@
 (define (render-mandelbrot)
   (render-function point-color width height))
 
+;;; Draw with the turtle, or render to the image file given by
+;;; scheme.py -output (which --resume can continue after an interruption).
 (define (draw)
-  (speed 0)
-  (setheading 90)
-  (render-mandelbrot)
-  (exitonclick))
+  (if (render-output)
+      (render-image point-color width height (render-output))
+      (begin (speed 0)
+             (setheading 90)
+             (render-mandelbrot)
+             (exitonclick))))
 
 ; Please leave this last line alone.  You may add additional procedures above
 ; this line.  All Scheme tokens in this file (including the one below) count
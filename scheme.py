@@ -2,8 +2,19 @@
 eval/apply mutual recurrence, environment model, and read-eval-print loop.
 """
 
+import sys
+if __name__ == "__main__":
+    # The modules that extend the interpreter import scheme, so a program run
+    # by this script runs in that module rather than in a copy of this one.
+    import scheme
+    scheme.run(*sys.argv[1:])
+    sys.exit()
+
 from scheme_primitives import *
 from scheme_reader import *
+import scheme_image # Registers the image file primitives
+import scheme_cache
+import scheme_memo
 from ucb import main, trace
 
 def scheme_apply(procedure, args, env):
@@ -16,17 +27,39 @@ def scheme_apply(procedure, args, env):
     elif isinstance(procedure, MuProcedure):
         frame = env.make_call_frame(procedure.formals, args)
         return scheme_eval(procedure.body, frame)
+    elif isinstance(procedure, MemoizedProcedure):
+        return procedure.apply(args, env)
     else:
         raise SchemeError("Cannot call {0} with {1}".format(str(procedure), str(args)))
 
+def scheme_call(procedure, args, env):
+    """Apply Scheme PROCEDURE to the Python sequence of argument values ARGS.
+
+    >>> scheme_call(create_global_frame().lookup('+'), (1, 2), None)
+    3
+    """
+    result = nil
+    for arg in reversed(args):
+        result = Pair(arg, result)
+    return scheme_apply(procedure, result, env)
+
+def scheme_call1(procedure, arg, env):
+    """Apply Scheme PROCEDURE to the single argument value ARG."""
+    return scheme_apply(procedure, Pair(arg, nil), env)
+
+def scheme_call2(procedure, arg0, arg1, env):
+    """Apply Scheme PROCEDURE to the argument values ARG0 and ARG1."""
+    return scheme_apply(procedure, Pair(arg0, Pair(arg1, nil)), env)
+
 def pairs_to_list(pairs):
     """Converts a scheme list to a python list
     >>> pairs_to_list(Pair(1, Pair(2, nil)))
     [1, 2]
     """
     result = []
-    for i in range(len(pairs)):
-        result.append(pairs[i])
+    while pairs is not nil:
+        result.append(pairs.first)
+        pairs = pairs.second
     return result
 
 def apply_primitive(procedure, args, env):
@@ -49,14 +82,35 @@ def apply_primitive(procedure, args, env):
         return procedure.fn(*py_args)
     except TypeError:
         raise SchemeError("Cannot apply {0} to {1}".format(str(args), str(procedure)))
+    except IndexError as err:
+        raise SchemeError(str(err))
 
 
 ################
 # Environments #
 ################
 
+# The runtime checks made (scheme.py --safety): 2 checks everything, 1 uses
+# unchecked primitives, and 0 also skips checking the number of arguments in
+# calls to procedures defined in Scheme
+safety = 2
+
+def set_safety(level):
+    """Make the interpreter make the runtime checks of safety LEVEL."""
+    global safety
+    if level not in (0, 1, 2):
+        raise SchemeError("safety must be 0, 1 or 2")
+    safety = level
+    use_unchecked_primitives(level < 2)
+
 class Frame:
-    """An environment frame binds Scheme symbols to Scheme values."""
+    """An environment frame binds Scheme symbols to Scheme values.
+
+    The global frame may also have autoloads, a dict from symbols to the
+    define forms that bind them, which are evaluated when the symbol is first
+    looked up or set."""
+
+    autoloads = None
 
     def __init__(self, parent):
         """An empty frame with a PARENT frame (that may be None)."""
@@ -76,6 +130,8 @@ class Frame:
             return self.bindings[symbol]
         elif self.parent != None:
             return self.parent.lookup(symbol)
+        elif self.autoload(symbol):
+            return self.bindings[symbol]
         else:
             raise SchemeError("unknown identifier: {0}".format(str(symbol)))
 
@@ -84,9 +140,19 @@ class Frame:
             self.bindings[symbol] = value
         elif self.parent != None:
             self.parent.set(symbol, value)
+        elif self.autoload(symbol):
+            self.bindings[symbol] = value
         else:
             raise SchemeError("unknown identifier: {0}".format(str(symbol)))
 
+    def autoload(self, symbol):
+        """Evaluate the autoloaded definition of SYMBOL in SELF, if there is
+        one, and return whether SYMBOL is now bound."""
+        if not self.autoloads or symbol not in self.autoloads:
+            return False
+        scheme_eval(self.autoloads.pop(symbol), self)
+        return symbol in self.bindings
+
     def global_frame(self):
         """The global environment at the root of the parent chain."""
         e = self
@@ -98,7 +164,7 @@ class Frame:
         """Return a new local frame whose parent is SELF, in which the symbols
         in the Scheme formal parameter list FORMALS are bound to the Scheme
         values in the Scheme value list VALS. Raise an error if too many or too
-        few arguments are given.
+        few arguments are given, unless the safety is 0.
 
         >>> env = create_global_frame()
         >>> formals, vals = read_line("(a b c)"), read_line("(1 2 3)")
@@ -107,7 +173,19 @@ class Frame:
         >>> formals, vals = read_line("(a b . c)"), read_line("(1 2 3 4 5)")
         >>> env.make_call_frame(formals, vals)
         <{a: 1, b: 2, c: (3 4 5)} -> <Global Frame>>
+        >>> set_safety(0)
+        >>> env.make_call_frame(read_line("(a b)"), read_line("(1 2 3)"))
+        <{a: 1, b: 2} -> <Global Frame>>
+        >>> set_safety(2)
         """
+        if not safety:
+            frame = Frame(self)
+            while isinstance(formals, Pair) and vals is not nil:
+                frame.bindings[formals.first] = vals.first
+                formals, vals = formals.second, vals.second
+            if formals is not nil and not isinstance(formals, Pair):
+                frame.bindings[formals] = vals
+            return frame
         if scheme_dottedp(formals):
             frame = Frame(self)
             while True:
@@ -132,6 +210,8 @@ class Frame:
     def define(self, sym, val):
         """Define Scheme symbol SYM to have value VAL in SELF."""
         self.bindings[sym] = val
+        if self.autoloads:
+            self.autoloads.pop(sym, None)
 
 class LambdaProcedure:
     """A procedure defined by a lambda expression or the complex define form."""
@@ -180,6 +260,113 @@ class MuProcedure:
         args = (self.formals, self.body)
         return "MuProcedure({0}, {1})".format(*(repr(a) for a in args))
 
+class MemoizedProcedure:
+    """A procedure that caches the results of calling PROCEDURE, a lambda or
+    primitive procedure, in CACHE (see scheme_memo).  Calls whose arguments
+    are equal? share a result."""
+
+    def __init__(self, procedure, cache):
+        self.procedure = procedure
+        self.cache = cache
+
+    def __str__(self):
+        return "(memoized {0})".format(str(self.procedure))
+
+    def __repr__(self):
+        return "MemoizedProcedure({0})".format(repr(self.procedure))
+
+    def apply(self, args, env):
+        """Return the result of applying PROCEDURE to ARGS, computing it in
+        ENV only if it is not cached."""
+        key = scheme_hashtables.hash_key(args)
+        value = self.cache.get(key)
+        if value is scheme_memo.MISSING:
+            value = scheme_apply(self.procedure, args, env)
+            self.cache.put(key, value)
+        return value
+
+class MultipleValues:
+    """The result of (values v ...) with other than one value, VALS, a tuple.
+    A single value is returned as itself."""
+    __slots__ = ('vals',)
+
+    def __init__(self, vals):
+        self.vals = vals
+
+    def __str__(self):
+        return "\n".join(str(val) for val in self.vals)
+
+    def __repr__(self):
+        return "MultipleValues({0})".format(repr(self.vals))
+
+def values_of(value):
+    """Return a tuple of the values in VALUE, the result of an expression."""
+    if isinstance(value, MultipleValues):
+        return value.vals
+    return (value,)
+
+def bind_values(frame, formals, vals):
+    """Bind the symbols in the Scheme formal parameter list FORMALS to the
+    values in the tuple VALS in FRAME, as a call would."""
+    i = 0
+    while isinstance(formals, Pair):
+        if i == len(vals):
+            raise SchemeError("too few values for {0}".format(str(formals)))
+        frame.bindings[formals.first] = vals[i]
+        formals, i = formals.second, i + 1
+    if formals is not nil:
+        frame.bindings[formals] = scheme_list(*vals[i:])
+    elif i < len(vals):
+        raise SchemeError("too many values: {0}".format(len(vals)))
+
+class Promise:
+    """A promise to evaluate the Scheme expression EXPR in the Frame ENV when
+    it is first forced, or, if ENV is None, to call EXPR[0] on the arguments
+    EXPR[1:].  The value of a LAZY promise (made by delay-force) is itself a
+    promise, which is forced in its place."""
+
+    def __init__(self, expr, env, lazy=False):
+        self.expr = expr
+        self.env = env
+        self.lazy = lazy
+        self.forced = False
+        self.value = None
+
+    def __str__(self):
+        return "#[promise ({0}forced)]".format("" if self.forced else "not ")
+
+    def _compute(self):
+        if self.env is None:
+            return self.expr[0](*self.expr[1:])
+        return scheme_eval(self.expr, self.env)
+
+    def force(self):
+        """Return the value of this promise, computing it the first time.
+        Chains of lazy promises are followed in a loop, so forcing them does
+        not grow the Python stack.
+
+        >>> env = create_global_frame()
+        >>> _ = scheme_eval(read_line("(define (loop n) (if (= n 0) "
+        ...     "(delay 'done) (delay-force (loop (- n 1)))))"), env)
+        >>> scheme_eval(read_line("(force (loop 10000))"), env)
+        'done'
+        """
+        chain, promise = [], self
+        while not promise.forced:
+            value = promise._compute()
+            if promise.forced:  # Forced again while it was computed
+                break
+            if promise.lazy and isinstance(value, Promise):
+                chain.append(promise)
+                promise = value
+            else:
+                promise.value, promise.forced = value, True
+                promise.expr = promise.env = None
+        for lazy in chain:
+            lazy.value, lazy.forced = promise.value, True
+            lazy.expr = lazy.env = None
+        return promise.value
+
 
 #################
 # Special forms #
@@ -233,9 +420,115 @@ def do_define_form(vals, env):
         raise SchemeError("bad argument to define")
     return target
 
+def do_define_memoized_form(vals, env):
+    """Evaluate a define-memoized form with parameters VALS in environment
+    ENV.  It defines a procedure like define, but memoizes it using any
+    keyword options, such as #:capacity 100, that precede the body.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line("(define-memoized (fib n) #:policy lfu "
+    ...     "(if (< n 2) n (+ (fib (- n 2)) (fib (- n 1)))))"), env)
+    >>> scheme_eval(read_line("(fib 80)"), env)
+    23416728348467685
+    >>> print(scheme_eval(read_line("(memo-stats fib)"), env))
+    ((hits . 78) (misses . 81) (evictions . 0) (size . 81) (capacity . False) (policy . lfu))
+    """
+    check_form(vals, 2)
+    target = vals.first
+    if not isinstance(target, Pair):
+        raise SchemeError("bad argument to define-memoized")
+    options, body = [], vals.second
+    while type(body.first) is Keyword:
+        if body.second is nil:
+            break
+        options.extend([body.first, body.second.first])
+        body = body.second.second
+        check_form(body, 1)
+    cache = memo_cache(options, "define-memoized")
+    do_define_form(Pair(target, body), env)
+    procedure = MemoizedProcedure(env.lookup(target.first), cache)
+    env.define(target.first, procedure)
+    return target
+
+def do_memoize_form(vals, env):
+    """Evaluate a memoize form with parameters VALS in environment ENV.  It
+    returns a memoized version of the value of its first operand, configured
+    by the keyword options that follow, which are not evaluated.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line("(define sq (memoize (lambda (x) (* x x)) "
+    ...                           "#:capacity 2 #:policy lfu))"), env)
+    >>> scheme_eval(read_line("(+ (sq 3) (sq 3))"), env)
+    18
+    >>> print(scheme_eval(read_line("(memo-stats sq)"), env))
+    ((hits . 1) (misses . 1) (evictions . 0) (size . 1) (capacity . 2) (policy . lfu))
+    """
+    check_form(vals, 1)
+    procedure = scheme_eval(vals.first, env)
+    if isinstance(procedure, MemoizedProcedure):
+        procedure = procedure.procedure
+    if not isinstance(procedure, (LambdaProcedure, PrimitiveProcedure)):
+        raise SchemeError("cannot memoize {0}".format(str(procedure)))
+    return MemoizedProcedure(procedure, memo_cache(list(vals.second),
+                                                   "memoize"))
+
+def do_delay_form(vals, env, lazy=False):
+    """Evaluate a delay (or, if LAZY, delay-force) form with parameters VALS
+    in environment ENV."""
+    check_form(vals, 1, 1)
+    return Promise(vals.first, env, lazy)
+
+def do_cons_stream_form(vals, env):
+    """Evaluate a cons-stream form with parameters VALS in environment ENV,
+    which pairs the value of its first operand with a promise of its second."""
+    check_form(vals, 2, 2)
+    return Pair(scheme_eval(vals.first, env), Promise(vals.second.first, env))
+
+def do_let_values_form(vals, env):
+    """Evaluate a let-values form with parameters VALS in environment ENV,
+    which binds the formals of each binding to the values of its expression.
+
+    >>> env = create_global_frame()
+    >>> scheme_eval(read_line("(let-values (((a b) (values 1 2)) "
+    ...                       "((c . d) (values 3 4 5))) (list a b c d))"), env)
+    Pair(1, Pair(2, Pair(3, Pair(Pair(4, Pair(5, nil)), nil))))
+    """
+    check_form(vals, 2)
+    bindings = vals.first
+    if not scheme_listp(bindings):
+        raise SchemeError("bad bindings list in let-values form")
+    frame = Frame(env)
+    for binding in bindings:
+        check_form(binding, 2, 2)
+        formals = binding.first
+        check_formals(formals)
+        bind_values(frame, formals, values_of(scheme_eval(binding.second.first,
+                                                          env)))
+    return begin_body(vals.second), frame
+
+def do_receive_form(vals, env):
+    """Evaluate a receive form (receive FORMALS EXPR BODY ...) with
+    parameters VALS in environment ENV."""
+    check_form(vals, 3)
+    formals = vals.first
+    check_formals(formals)
+    frame = Frame(env)
+    bind_values(frame, formals, values_of(scheme_eval(vals.second.first, env)))
+    return begin_body(vals.second.second), frame
+
+def begin_body(body):
+    """Return a single expression that evaluates the expressions in BODY."""
+    return body.first if body.second is nil else begin(body)
+
+# Whether quoted lists are replaced by immutable ArrayLists when first
+# evaluated (scheme.py --immutable-literals)
+immutable_literals = False
+
 def do_quote_form(vals):
     """Evaluate a quote form with parameters VALS."""
     check_form(vals, 1, 1)
+    if immutable_literals and type(vals.first) is Pair:
+        vals.first = freeze(vals.first)
     return vals.first
 
 def eval_bindings(bindings, env, recursive=False):
@@ -269,11 +562,11 @@ def do_normal_let(vals, env, recursive=False):
     names, values = eval_bindings(bindings, env, recursive)
     new_env = env.make_call_frame(names, values)
 
-    last = len(exprs) - 1
-    for i in range(0, last):
-        scheme_eval(exprs[i], new_env)
+    while exprs.second is not nil:
+        scheme_eval(exprs.first, new_env)
+        exprs = exprs.second
 
-    return exprs[last], new_env
+    return exprs.first, new_env
 
 def do_named_let(vals, env):
     """
@@ -325,25 +618,25 @@ def do_set_form(vals, env):
 def do_if_form(vals, env):
     """Evaluate if form with parameters VALS in environment ENV."""
     check_form(vals, 2, 3)
-    cond = scheme_eval(vals[0], env)
+    cond = scheme_eval(vals.first, env)
+    vals = vals.second
     if scheme_true(cond):
-        return vals[1]
+        return vals.first
     else:
-        if vals.second.second is nil:
+        if vals.second is nil:
             return okay
         else:
-            return vals[2]
+            return vals.second.first
 
 def do_and_form(vals, env):
     """Evaluate short-circuited and with parameters VALS in environment ENV."""
-    if len(vals) == 0:
+    if vals is nil:
         return True
-    for i in range(len(vals)):
-        val = vals[i]
-        if i == len(vals) - 1:
-            return val
-        if scheme_false(scheme_eval(val, env)):
+    while vals.second is not nil:
+        if scheme_false(scheme_eval(vals.first, env)):
             return False
+        vals = vals.second
+    return vals.first
 
 def quote(value):
     """Return a Scheme expression quoting the Scheme VALUE.
@@ -354,19 +647,18 @@ def quote(value):
     >>> scheme_eval(s, Frame(None))  # "hello" is undefined in this frame.
     'hello'
     """
-    return Pair("quote", Pair(value, nil))
+    return Pair(Symbol("quote"), Pair(value, nil))
 
 def do_or_form(vals, env):
     """Evaluate short-circuited or with parameters VALS in environment ENV."""
-    num_vals = len(vals)
-    if num_vals == 0:
+    if vals is nil:
         return False
-    for i, val in enumerate(vals):
-        if i == num_vals - 1:
-            return val
-        evaluated = scheme_eval(val, env)
+    while vals.second is not nil:
+        evaluated = scheme_eval(vals.first, env)
         if scheme_true(evaluated):
             return quote(evaluated)
+        vals = vals.second
+    return vals.first
 
 def do_cond_form(vals, env):
     """Evaluate cond form with parameters VALS in environment ENV."""
@@ -397,15 +689,15 @@ def do_cond_form(vals, env):
 
 def begin(vals):
     check_form(vals, 1)
-    return Pair('begin', vals)
+    return Pair(Symbol('begin'), vals)
 
 def do_begin_form(vals, env):
     """Evaluate begin form with parameters VALS in environment ENV."""
     check_form(vals, 1)
-    vals = list(vals)
-    for val in vals[:-1]:
-        scheme_eval(val, env)
-    return vals[-1]
+    while vals.second is not nil:
+        scheme_eval(vals.first, env)
+        vals = vals.second
+    return vals.first
 
 LOGIC_FORMS = {
         "and": do_and_form,
@@ -467,57 +759,128 @@ def check_formals(formals):
         raise SchemeError("%s not formed properly", formals)
 
 
+# Types of the atoms that evaluate to themselves
+_SELF_EVALUATING = {bool, int, float, SchemeString, Keyword}
+
 def scheme_eval(expr, env):
     """Evaluate Scheme expression EXPR in environment ENV."""
-    while True:
-        if expr is None:
-            raise SchemeError("Cannot evaluate an undefined expression.")
-
-        # Evaluate Atoms
-        if scheme_symbolp(expr):
-            return env.lookup(expr)
-        elif scheme_atomp(expr) or scheme_stringp(expr) or expr is okay:
-            return expr
-        elif scheme_vectorp(expr):
-            raise SchemeError("cannot eval vector: " + str(expr))
-
-        # All non-atomic expressions are lists.
-        if not scheme_listp(expr):
-            raise SchemeError("malformed list: {0}".format(str(expr)))
-        first, rest = expr.first, expr.second
-
-        # Evaluate Combinations
-        if (scheme_symbolp(first) # first might be unhashable
-            and first in LOGIC_FORMS):
-            expr = LOGIC_FORMS[first](rest, env)
-        elif first == "let":
-            expr, env = do_let_form(rest, env)
-        elif first == "letrec":
-            expr, env = do_let_form(rest, env, True)
-        elif first == "lambda":
-            return do_lambda_form(rest, env)
-        elif first == "define":
-            return do_define_form(rest, env)
-        elif first == "set!":
-            return do_set_form(rest, env)
-        elif first == "quote":
-            return do_quote_form(rest)
-        elif first == "mu":
-            return do_mu_form(rest)
-        else:
-            procedure = scheme_eval(first, env)
-            args = rest.map(lambda arg: scheme_eval(arg, env))
-
-            if isinstance(procedure, PrimitiveProcedure):
-                return apply_primitive(procedure, args, env)
-            elif isinstance(procedure, LambdaProcedure):
-                frame = procedure.env.make_call_frame(procedure.formals, args)
-                expr, env = procedure.body, frame
-            elif isinstance(procedure, MuProcedure):
-                frame = env.make_call_frame(procedure.formals, args)
-                expr, env = procedure.body, frame
+    misses = None  # The caches and keys of memoized calls in tail position
+    try:
+        while True:
+            if expr is None:
+                raise SchemeError("Cannot evaluate an undefined expression.")
+
+            # Evaluate Atoms
+            if type(expr) is Symbol:
+                value = env.lookup(expr)
+                break
+            elif type(expr) in _SELF_EVALUATING or expr is nil or expr is okay:
+                value = expr
+                break
+            elif scheme_vectorp(expr):
+                raise SchemeError("cannot eval vector: " + str(expr))
+
+            # All non-atomic expressions are lists.
+            if not scheme_listp(expr):
+                raise SchemeError("malformed list: {0}".format(str(expr)))
+            first, rest = expr.first, expr.second
+
+            # Evaluate Combinations
+            if type(first) is Symbol and first in LOGIC_FORMS:
+                expr = LOGIC_FORMS[first](rest, env)
+            elif first == "let":
+                expr, env = do_let_form(rest, env)
+            elif first == "letrec":
+                expr, env = do_let_form(rest, env, True)
+            elif first == "lambda":
+                value = do_lambda_form(rest, env)
+                break
+            elif first == "define":
+                value = do_define_form(rest, env)
+                break
+            elif first == "set!":
+                value = do_set_form(rest, env)
+                break
+            elif first == "quote":
+                value = do_quote_form(rest)
+                break
+            elif first == "mu":
+                value = do_mu_form(rest)
+                break
+            elif first == "define-memoized":
+                value = do_define_memoized_form(rest, env)
+                break
+            elif first == "memoize":
+                value = do_memoize_form(rest, env)
+                break
+            elif first == "delay":
+                value = do_delay_form(rest, env)
+                break
+            elif first == "delay-force":
+                value = do_delay_form(rest, env, True)
+                break
+            elif first == "cons-stream":
+                value = do_cons_stream_form(rest, env)
+                break
+            elif first == "let-values":
+                expr, env = do_let_values_form(rest, env)
+            elif first == "receive":
+                expr, env = do_receive_form(rest, env)
+            elif first == "define-record-type":
+                value = scheme_records.do_define_record_type_form(rest, env)
+                break
+            elif first == "future":
+                value = scheme_parallel.do_future_form(rest, env)
+                break
             else:
-                raise SchemeError("Cannot call {0}".format(str(procedure)))
+                procedure = scheme_eval(first, env)
+                args = rest.map(lambda arg: scheme_eval(arg, env))
+
+                if isinstance(procedure, PrimitiveProcedure):
+                    value = apply_primitive(procedure, args, env)
+                    break
+                elif isinstance(procedure, LambdaProcedure):
+                    frame = procedure.env.make_call_frame(procedure.formals,
+                                                          args)
+                    expr, env = procedure.body, frame
+                elif isinstance(procedure, MuProcedure):
+                    frame = env.make_call_frame(procedure.formals, args)
+                    expr, env = procedure.body, frame
+                elif isinstance(procedure, MemoizedProcedure):
+                    key = scheme_hashtables.hash_key(args)
+                    value = procedure.cache.get(key)
+                    if value is not scheme_memo.MISSING:
+                        break
+                    memoized, procedure = procedure, procedure.procedure
+                    if not isinstance(procedure, LambdaProcedure):
+                        value = scheme_apply(procedure, args, env)
+                        memoized.cache.put(key, value)
+                        break
+                    # Evaluate the body in this loop, as for a lambda, and
+                    # cache its value once the loop ends
+                    if misses is None:
+                        misses = []
+                    misses.append((memoized.cache, key))
+                    frame = procedure.env.make_call_frame(procedure.formals,
+                                                          args)
+                    expr, env = procedure.body, frame
+                else:
+                    raise SchemeError("Cannot call {0}".format(str(procedure)))
+    except SchemeError as err:
+        if isinstance(expr, Pair):
+            _note_error(err, expr)
+        raise
+    if misses is not None:
+        for cache, key in misses:
+            cache.put(key, value)
+    return value
+
+def _note_error(err, expr):
+    """Record on the SchemeError ERR that the list EXPR was being evaluated
+    when it was raised, after the lists evaluated within EXPR."""
+    if not hasattr(err, 'exprs'):
+        err.exprs = []
+    err.exprs.append(expr)
 
 
 ################
@@ -525,16 +888,26 @@ def scheme_eval(expr, env):
 ################
 
 def read_eval_print_loop(next_line, env, quiet=False, startup=False,
-                         interactive=False, load_files=()):
-    """Read and evaluate input until an end of file or keyboard interrupt."""
+                         interactive=False, load_files=(), filename=None,
+                         cache=None):
+    """Read and evaluate input until an end of file or keyboard interrupt.
+    If NEXT_LINE reads the file FILENAME, errors report where in it they
+    occurred.  Each expression read is added to the CacheWriter CACHE, if
+    there is one, before it is evaluated."""
+    spans = SourceSpans() if filename is not None else None
     if startup:
         for filename in load_files:
             scheme_load(filename, True, env)
     while True:
+        reading = True
         try:
             src = next_line()
             while src.more_on_line:
-                expression = scheme_read(src)
+                reading = True
+                expression = scheme_read(src, spans)
+                if cache is not None:
+                    cache.add(expression)
+                reading = False
                 result = scheme_eval(expression, env)
                 if not quiet and result is not None:
                     print(result)
@@ -542,7 +915,9 @@ def read_eval_print_loop(next_line, env, quiet=False, startup=False,
             if (isinstance(err, RuntimeError) and
                 'maximum recursion depth exceeded' not in err.args[0]):
                 raise
-            print("Error:", err)
+            if reading and cache is not None:
+                cache.fail()
+            report_error(err, filename, spans)
         except KeyboardInterrupt:  # <Control>-C
             if not startup:
                 raise
@@ -552,6 +927,20 @@ def read_eval_print_loop(next_line, env, quiet=False, startup=False,
         except EOFError:  # <Control>-D, etc.
             return
 
+def report_error(err, filename=None, spans=None):
+    """Print the error ERR, followed by the position in the file FILENAME of
+    the innermost list being evaluated when it was raised that has a span in
+    the SourceSpans SPANS, if there is one."""
+    print("Error:", err)
+    for expr in getattr(err, 'exprs', ()) if spans else ():
+        span = spans.get(expr)
+        if span is not None:
+            (line, column), _ = span
+            if column is None:
+                print("    at {0}:{1}".format(filename, line))
+            else:
+                print("    at {0}:{1}:{2}".format(filename, line, column + 1))
+            return
 
 def scheme_load(*args):
     """Load a Scheme source file. ARGS should be of the form (SYM, ENV) or (SYM,
@@ -563,17 +952,51 @@ def scheme_load(*args):
     sym = args[0]
     quiet = args[1] if len(args) > 2 else True
     env = args[-1]
-    if (scheme_stringp(sym)):
-        sym = eval(sym)
-    check_type(sym, scheme_symbolp, 0, "load")
-    with scheme_open(sym) as infile:
-        lines = infile.readlines()
-    args = (lines, None) if quiet else (lines,)
-    def next_line():
-        return buffer_lines(*args)
-    read_eval_print_loop(next_line, env.global_frame(), quiet=quiet)
+    filename = check_filename(sym, 0, "load")
+    with scheme_open(filename) as infile:
+        forms = scheme_cache.cached_forms(infile.name) if quiet else None
+        if forms is not None:
+            eval_forms(forms, env.global_frame(), infile.name)
+        elif quiet:
+            cache = scheme_cache.CacheWriter(infile.name)
+            read_eval_print_loop(file_reader(infile, quiet),
+                                 env.global_frame(), quiet=quiet,
+                                 filename=infile.name, cache=cache)
+            cache.close()
+        else:
+            read_eval_print_loop(file_reader(infile, quiet),
+                                 env.global_frame(), quiet=quiet)
     return okay
 
+def eval_forms(forms, env, filename=None):
+    """Evaluate the already parsed FORMS in ENV, reporting errors as a quiet
+    read_eval_print_loop does.  If FORMS are all the forms of the file
+    FILENAME, errors report where in it they occurred."""
+    spans = None
+    for expression in forms:
+        try:
+            scheme_eval(expression, env)
+        except (SchemeError, SyntaxError, ValueError, RuntimeError) as err:
+            if (isinstance(err, RuntimeError) and
+                'maximum recursion depth exceeded' not in err.args[0]):
+                raise
+            if filename is not None and spans is None:
+                spans = source_spans(forms, filename)
+            report_error(err, filename, spans)
+
+def file_reader(infile, quiet):
+    """Return a next_line function for read_eval_print_loop that reads the
+    open file INFILE lazily, one line at a time, echoing its lines after a
+    prompt unless QUIET."""
+    if quiet:
+        tokens = LineTokenizer(infile)
+        def next_line():
+            return Buffer(tokens)
+    else:
+        def next_line():
+            return buffer_lines(infile)
+    return next_line
+
 def scheme_open(filename):
     """If either FILENAME or FILENAME.scm is the name of a valid file,
     return a Python file opened to it. Otherwise, raise an error."""
@@ -587,33 +1010,292 @@ def scheme_open(filename):
     except IOError as exc:
         raise SchemeError(str(exc))
 
+def read_file(filename, spans=None):
+    """Return a Python list of the top-level expressions in the Scheme source
+    file FILENAME, without evaluating them.  If SPANS is a SourceSpans table,
+    record the source spans of their lists in it, as scheme_read does."""
+    exprs = []
+    with scheme_open(filename) as infile:
+        if spans is None:
+            forms = scheme_cache.read_forms(infile.name)
+            if forms is not None:
+                return forms
+        src = Buffer(LineTokenizer(infile))
+        try:
+            while True:
+                exprs.append(scheme_read(src, spans))
+        except EOFError:
+            return exprs
+
+def source_spans(forms, filename):
+    """Return a SourceSpans table of the lists in FORMS, the top-level forms
+    of the file FILENAME read earlier (perhaps from its cache), by reading it
+    again and matching their lists with the ones read now."""
+    spans, result = SourceSpans(), SourceSpans()
+    pending = list(zip(forms, read_file(filename, spans)))
+    while pending:
+        expr, read = pending.pop()
+        if isinstance(expr, Pair) and isinstance(read, Pair):
+            span = spans.get(read)
+            if span is not None:
+                result.record(expr, *span)
+            pending.append((expr.first, read.first))
+            pending.append((expr.second, read.second))
+    return result
+
+def scheme_definep(expr):
+    """Return whether EXPR is a define form.
+
+    >>> scheme_definep(read_line("(define (f x) x)"))
+    True
+    >>> scheme_definep(read_line("(f 1)"))
+    False
+    """
+    return isinstance(expr, Pair) and expr.first == "define"
+
+def load_definitions(filename, env):
+    """Evaluate only the top-level define forms of FILENAME in ENV, skipping
+    any other expressions (such as a final call that starts drawing)."""
+    for expr in read_file(filename):
+        if scheme_definep(expr):
+            scheme_eval(expr, env)
+
+def defined_name(expr):
+    """Return the symbol bound by the define form EXPR, or None if it is
+    malformed.
+
+    >>> defined_name(read_line("(define (f x) x)"))
+    'f'
+    >>> defined_name(read_line("(define y 2)"))
+    'y'
+    """
+    target = expr.second.first if isinstance(expr.second, Pair) else None
+    if isinstance(target, Pair):
+        target = target.first
+    return target if scheme_symbolp(target) else None
+
+def scheme_autoload(sym, env):
+    """Add the top-level definitions of the Scheme source file SYM to the
+    autoloads of the global frame of ENV, so that each is evaluated only when
+    its name is first used.  Any other forms in the file are evaluated now.
+    As with load, the definitions replace existing bindings of their names,
+    which are removed until the definitions are evaluated.
+
+    >>> env = create_global_frame()
+    >>> scheme_autoload('scheme_lib', env)
+    okay
+    >>> 'fourth' in env.bindings, 'fourth' in env.autoloads
+    (False, True)
+    >>> scheme_eval(read_line("(fourth '(1 2 3 4))"), env)
+    4
+    >>> sorted(name for name in ['fourth', 'cadddr', 'caddr', 'cadr', 'cddr']
+    ...        if name in env.bindings)
+    ['cadddr', 'cadr', 'cddr', 'fourth']
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'lib.scm')
+    >>> with open(path, 'w') as outfile:
+    ...     _ = outfile.write("(define (max . xs) 'library)")
+    >>> scheme_autoload(path, env)
+    okay
+    >>> print(scheme_eval(read_line("(max 1 2)"), env))
+    library
+    """
+    filename = check_filename(sym, 0, "autoload")
+    env = env.global_frame()
+    if env.autoloads is None:
+        env.autoloads = {}
+    others = []
+    for expr in read_file(filename):
+        name = defined_name(expr) if scheme_definep(expr) else None
+        if name is None:
+            others.append(expr)
+        else:
+            env.bindings.pop(name, None)
+            env.autoloads[name] = expr
+    eval_forms(others, env)
+    return okay
+
+###################
+# Multiple values #
+###################
+
+def scheme_values(*vals):
+    """Return the values VALS, or the single one if there is only one."""
+    if len(vals) == 1:
+        return vals[0]
+    return MultipleValues(vals)
+
+def scheme_call_with_values(producer, consumer, env):
+    """Call CONSUMER with the values returned by calling PRODUCER."""
+    vals = values_of(scheme_apply(producer, nil, env))
+    return scheme_apply(consumer, scheme_list(*vals), env)
+
+###############
+# Memoization #
+###############
+
+def memo_cache(options, name):
+    """Return a new cache for a memoized procedure, configured by OPTIONS, a
+    sequence of alternating keywords and values given to NAME."""
+    capacity, policy = None, 'lru'
+    if len(options) % 2:
+        raise SchemeError("{0}: no value for {1}".format(name, options[-1]))
+    for keyword, value in zip(options[::2], options[1::2]):
+        if keyword == '#:capacity' and type(keyword) is Keyword:
+            if value is not False:
+                check_type(value, scheme_integerp, 0, name)
+                if value < 0:
+                    raise SchemeError("{0}: negative capacity".format(name))
+                capacity = value
+        elif keyword == '#:policy' and type(keyword) is Keyword:
+            if not scheme_symbolp(value) or value not in scheme_memo.POLICIES:
+                raise SchemeError("{0}: unknown policy: {1}".format(name,
+                                                                    value))
+            policy = value
+        else:
+            raise SchemeError("{0}: unknown option: {1}".format(name, keyword))
+    return scheme_memo.POLICIES[policy](capacity)
+
+def scheme_memo_stats(procedure):
+    """Return an association list of the cache statistics of PROCEDURE."""
+    check_type(procedure, lambda x: isinstance(x, MemoizedProcedure), 0,
+               "memo-stats")
+    cache = procedure.cache
+    stats = [('hits', cache.hits), ('misses', cache.misses),
+             ('evictions', cache.evictions), ('size', len(cache)),
+             ('capacity', False if cache.capacity is None else cache.capacity),
+             ('policy', Symbol(cache.policy))]
+    return scheme_list(*[Pair(Symbol(k), v) for k, v in stats])
+
+def scheme_memo_clear(procedure):
+    """Empty the cache of PROCEDURE."""
+    check_type(procedure, lambda x: isinstance(x, MemoizedProcedure), 0,
+               "memo-clear!")
+    procedure.cache.clear()
+    return okay
+
 def create_global_frame():
     """Initialize and return a single-frame environment with built-in names."""
     env = Frame(None)
     env.define("eval", PrimitiveProcedure(scheme_eval, True))
     env.define("apply", PrimitiveProcedure(scheme_apply, True))
     env.define("load", PrimitiveProcedure(scheme_load, True))
+    env.define("autoload", PrimitiveProcedure(scheme_autoload, True))
+    env.define("values", PrimitiveProcedure(scheme_values))
+    env.define("call-with-values",
+               PrimitiveProcedure(scheme_call_with_values, True))
+    env.define("memo-stats", PrimitiveProcedure(scheme_memo_stats))
+    env.define("memo-clear!", PrimitiveProcedure(scheme_memo_clear))
     add_primitives(env)
     return env
 
-@main
+import scheme_stdlib # Registers the library primitives; imports this module
+import scheme_hashtables # Registers hash tables; imports this module
+import scheme_streams # Registers the stream primitives; imports this module
+import scheme_records # Defines record types; imports this module
+import scheme_snapshot # Registers save-image; imports this module
+import scheme_parallel # Registers parallel maps; imports this module
+import scheme_reload # Registers reload; imports this module
+
+def positive_option(option, argv):
+    """Remove and return the first of the command-line arguments ARGV, the
+    value of OPTION, exiting with a message if it is not a positive
+    integer."""
+    value = argv.pop(0)
+    if not value.isdigit() or int(value) < 1:
+        print(option, "must be a positive integer, not", value)
+        sys.exit(1)
+    return int(value)
+
 def run(*argv):
+    import scheme_daemon # Runs scheme.py -daemon
+    import scheme_render # Registers the render primitives
+    global immutable_literals
     next_line = buffer_input
     interactive = True
-    if argv:
+    batch = False
+    image = None
+    daemon = None
+    watch = False
+    source = None
+    autoload_files = []
+    load_files = ()
+    argv = list(argv)
+    options = scheme_render.options
+    while argv and (argv[0] in ('--resume', '--batch', '--immutable-literals',
+                                '--watch', '-output', '-checkpoint-interval',
+                                '-image', '-autoload', '-jobs', '-daemon') or
+                    argv[0].startswith('--safety=')):
+        option = argv.pop(0)
+        if option.startswith('--safety='):
+            try:
+                set_safety(int(option[len('--safety='):]))
+            except (ValueError, SchemeError):
+                print("--safety must be 0, 1 or 2")
+                sys.exit(1)
+        elif option == '--resume':
+            options.resume = True
+        elif option == '--batch':
+            batch = True
+        elif option == '--immutable-literals':
+            immutable_literals = True
+        elif option == '--watch':
+            watch = True
+        elif not argv:
+            print("missing value for", option)
+            sys.exit(1)
+        elif option == '-output':
+            options.output = argv.pop(0)
+        elif option == '-image':
+            image = argv.pop(0)
+        elif option == '-autoload':
+            autoload_files.append(argv.pop(0))
+        elif option == '-jobs':
+            scheme_parallel.options.workers = positive_option(option, argv)
+        elif option == '-daemon':
+            daemon = argv.pop(0)
+        else:
+            options.checkpoint_interval = positive_option(option, argv)
+    if argv and daemon is None:
         try:
             filename = argv[0]
             if filename == '-load':
                 load_files = argv[1:]
             else:
                 input_file = open(argv[0])
-                lines = input_file.readlines()
-                def next_line():
-                    return buffer_lines(lines)
+                options.sources.append(argv[0])
+                next_line = file_reader(input_file, batch)
                 interactive = False
+                if batch:
+                    source = argv[0]
         except IOError as err:
             print(err)
             sys.exit(1)
-    read_eval_print_loop(next_line, create_global_frame(), startup=True,
-                         interactive=interactive)
+    if image is None:
+        env = create_global_frame()
+    else:
+        try:
+            env = scheme_snapshot.load_image(image)
+        except (IOError, SchemeError) as err:
+            print(err)
+            sys.exit(1)
+    for filename in autoload_files:
+        try:
+            scheme_autoload(filename, env)
+        except SchemeError as err:
+            print(err)
+            sys.exit(1)
+    if daemon is not None:
+        try:
+            for filename in argv:
+                scheme_reload.reload_file(filename, env, True)
+        except SchemeError as err:
+            print(err)
+            sys.exit(1)
+        scheme_daemon.serve(daemon, env, scheme_parallel.options.workers,
+                            argv if watch else ())
+        return
+    read_eval_print_loop(next_line, env, quiet=batch,
+                         startup=True, interactive=interactive,
+                         load_files=load_files, filename=source)
     tscheme_exitonclick()
@@ -0,0 +1,165 @@
+"""This module evaluates Scheme expressions cooperatively in an asyncio event
+loop, so that a long evaluation, such as a render, does not block the other
+tasks of a service.
+
+    value = await eval_async(expr, env, slice_steps=10000)
+
+Each evaluation runs in a thread of its own, which stops after every
+SLICE_STEPS evaluation steps until the event loop has run its other tasks.
+Only one evaluation runs at a time, so many of them can be interleaved on one
+loop without modifying the program's state at once.  Cancelling the task that
+awaits an evaluation stops it at its next step.
+
+While any evaluation is in progress, scheme_eval runs a copy of its code that
+calls a step function at the start of each iteration of its loop.  The
+original code, without the call, runs at all other times.
+"""
+
+import ast
+import asyncio
+import inspect
+import threading
+import scheme
+from scheme import *
+
+def _hooked_code(function, hook):
+    """Return a copy of the code of FUNCTION, whose body is a loop, that calls
+    the global function named HOOK at the start of each iteration."""
+    lines, start = inspect.getsourcelines(function)
+    tree = ast.parse(''.join(lines))
+    ast.increment_lineno(tree, start - 1)
+    loop = next(node for node in ast.walk(tree) if isinstance(node, ast.While))
+    call = ast.Expr(ast.Call(ast.Name(hook, ast.Load()), [], []))
+    loop.body.insert(0, ast.copy_location(call, loop.body[0]))
+    ast.fix_missing_locations(tree)
+    module = compile(tree, inspect.getsourcefile(function), 'exec')
+    return next(const for const in module.co_consts
+                if getattr(const, 'co_name', None) == function.__name__)
+
+_PLAIN_EVAL = scheme_eval.__code__
+_HOOKED_EVAL = _hooked_code(scheme_eval, '_eval_step')
+
+class EvaluationCancelled(SchemeError):
+    """The error that stops an evaluation whose task is cancelled."""
+
+# The Evaluation run by the current thread, if any
+_current = threading.local()
+
+# Held by the thread of the evaluation that is running
+_running = threading.Lock()
+
+# The number of evaluations in progress, which need the hooked scheme_eval
+_active = 0
+
+def _step():
+    evaluation = getattr(_current, 'evaluation', None)
+    if evaluation is not None:
+        evaluation.step()
+
+# The step function called by the hooked scheme_eval, a global of its module
+scheme._eval_step = _step
+
+def _set(future):
+    if not future.done():
+        future.set_result(None)
+
+class Evaluation:
+    """The evaluation of EXPR in ENV in a thread, which stops every
+    SLICE_STEPS steps and notifies the event loop LOOP through the future
+    STOPPED until it is resumed."""
+
+    def __init__(self, expr, env, slice_steps, loop):
+        self.expr, self.env = expr, env
+        self.slice_steps = slice_steps
+        self.loop = loop
+        self.steps = 0
+        self.cancelled = self.done = False
+        self.value = self.error = None
+        self.stopped = loop.create_future()
+        self.resumed = threading.Event()
+
+    def run(self):
+        """Evaluate the expression; the body of the thread."""
+        _current.evaluation = self
+        with _running:
+            try:
+                self.value = scheme_eval(self.expr, self.env)
+            except Exception as exc:
+                self.error = exc
+        self.done = True
+        self.loop.call_soon_threadsafe(_set, self.stopped)
+
+    def step(self):
+        """Count a step, stopping when the slice is used up."""
+        self.steps += 1
+        if self.steps >= self.slice_steps or self.cancelled:
+            self.steps = 0
+            _running.release()
+            self.loop.call_soon_threadsafe(_set, self.stopped)
+            self.resumed.wait()
+            self.resumed.clear()
+            _running.acquire()
+            if self.cancelled:
+                raise EvaluationCancelled("evaluation cancelled")
+
+    def resume(self):
+        """Let the thread evaluate another slice (in the loop's thread)."""
+        self.stopped = self.loop.create_future()
+        self.resumed.set()
+
+async def eval_async(expr, env, slice_steps=10000):
+    """Evaluate EXPR in environment ENV, yielding to the event loop every
+    SLICE_STEPS evaluation steps.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line(
+    ...     "(define (count n) (if (= n 0) n (count (- n 1))))"), env)
+    >>> async def both():
+    ...     return await asyncio.gather(
+    ...         eval_async(read_line("(count 2000)"), env, 100),
+    ...         eval_async(read_line("(+ 1 2)"), env, 100))
+    >>> asyncio.run(both())
+    [0, 3]
+    >>> async def cancel():
+    ...     task = asyncio.ensure_future(
+    ...         eval_async(read_line("(count 1e9)"), env, 100))
+    ...     await asyncio.sleep(0.01)
+    ...     task.cancel()
+    ...     try:
+    ...         await task
+    ...     except asyncio.CancelledError:
+    ...         return 'cancelled'
+    >>> asyncio.run(cancel())
+    'cancelled'
+    >>> asyncio.run(eval_async(read_line("(car 1)"), env))
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: argument 0 of car has wrong type (int)
+    """
+    global _active
+    evaluation = Evaluation(expr, env, max(1, slice_steps),
+                            asyncio.get_running_loop())
+    _active += 1
+    scheme_eval.__code__ = _HOOKED_EVAL
+    try:
+        threading.Thread(target=evaluation.run, daemon=True).start()
+        while True:
+            await evaluation.stopped
+            if evaluation.done:
+                break
+            await asyncio.sleep(0)
+            evaluation.resume()
+    except asyncio.CancelledError:
+        evaluation.cancelled = True
+        while not evaluation.done:
+            if evaluation.stopped.done():
+                evaluation.resume()
+            await asyncio.shield(evaluation.stopped)
+        raise
+    finally:
+        _active -= 1
+        if not _active:
+            scheme_eval.__code__ = _PLAIN_EVAL
+    if evaluation.error is not None:
+        raise evaluation.error
+    return evaluation.value
@@ -0,0 +1,76 @@
+"""This module times the interpreter at each safety level (scheme.py --safety)
+on a few workloads, and prints a table of the seconds each took.
+
+Usage: python3 scheme_bench.py [-size 8] [-repeat 3]
+
+The render workload evaluates point-color from contest.scm for every pixel of
+a SIZE by SIZE image.  Each time is the best of REPEAT runs.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from scheme import *
+from scheme_embed import Interpreter
+from ucb import main
+
+LEVELS = (2, 1, 0)
+
+PROGRAMS = """
+(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+(define (vector-sum! v n)
+  (define (loop i total)
+    (if (= i n)
+        total
+        (begin (vector-set! v i (* 2 (vector-ref v i)))
+               (loop (+ i 1) (+ total (vector-ref v i))))))
+  (loop 0 0))
+(define (render size)
+  (define (row y)
+    (define (pixel x)
+      (if (< x size) (begin (point-color x y) (pixel (+ x 1)))))
+    (if (< y size) (begin (pixel 0) (row (+ y 1)))))
+  (row 0))
+"""
+
+def workloads(size):
+    """The workloads, as (name, expression) pairs."""
+    return [('fib', "(fib 18)"),
+            ('vectors', "(vector-sum! (make-vector 20000 1) 20000)"),
+            ('render', "(render {0})".format(size))]
+
+def best_time(interpreter, expr, repeat):
+    """The least seconds taken to evaluate the string EXPR REPEAT times."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.eval_string(expr)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+@main
+def run(*argv):
+    parser = argparse.ArgumentParser(prog="scheme_bench.py",
+                                     description="Time the interpreter at "
+                                     "each safety level.")
+    parser.add_argument("-size", type=int, default=8,
+                        help="width and height of the rendered image")
+    parser.add_argument("-repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    interpreter = Interpreter()
+    interpreter.load('contest.scm', definitions_only=True)
+    interpreter.eval_string(PROGRAMS)
+    print("{0:<10}".format("workload") +
+          "".join("{0:>12}".format("safety " + str(level))
+                  for level in LEVELS))
+    for name, expr in workloads(args.size):
+        times = []
+        for level in LEVELS:
+            set_safety(level)
+            times.append(best_time(interpreter, expr, args.repeat))
+        set_safety(2)
+        print("{0:<10}".format(name) +
+              "".join("{0:>11.3f}s".format(t) for t in times))
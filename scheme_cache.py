@@ -0,0 +1,222 @@
+"""This module caches the parsed top-level forms of Scheme source files, so
+that loading a file again skips tokenizing and parsing it, much as Python
+caches bytecode in __pycache__.
+
+The cache for FILE.scm is the binary file FILE.scmc next to it.  It starts
+with a magic number, the cache format version, and the modification time,
+size and SHA-256 hash of the source it was made from, followed by the forms
+flattened into postfix order and written with marshal.  A cache that is
+stale, corrupt or from another version is ignored and rewritten.
+
+A load that misses the cache reads the file line by line as usual, and a
+CacheWriter flattens each form as it is read, writing the cache at the end.
+Only files that parse without errors or warnings are cached; the messages
+of others are reported as usual.
+"""
+
+import contextlib
+import hashlib
+import io
+import marshal
+import os
+import struct
+import scheme_tokens
+from scheme_reader import Pair, nil, Symbol, SchemeString, Keyword
+from scheme_reader import buffer_text, scheme_read
+
+MAGIC = b'SCMC'
+CACHE_VERSION = 2
+_HEADER = struct.Struct('>4sHqq32s')
+
+def cache_filename(filename):
+    """Return the name of the cache file for the source FILENAME."""
+    return filename + 'c'
+
+def flatten(exprs):
+    """Return a flat list of instructions that rebuild the Scheme values in
+    the list EXPRS.  Numbers and booleans stand for themselves, a str for
+    the symbol or keyword (starting with #:) it names, a tuple (s,) for the
+    string s, None for nil, and a tuple (n, dotted) replaces the last n
+    values (and a tail, if dotted) with the list of them.  Deeply nested
+    lists are traversed without recursion.
+
+    >>> from scheme_reader import read_line
+    >>> exprs = [read_line("(define (f . x) '(1 () \\"s\\"))"), 2]
+    >>> code = flatten(exprs)
+    >>> code
+    ['define', 'f', 'x', (1, True), 'quote', 1, None, ('s',), (3, False), (2, False), (3, False), 2]
+    >>> [str(expr) for expr in unflatten(code)]
+    ['(define (f . x) (quote (1 () "s")))', '2']
+    """
+    code = []
+    stack = list(reversed(exprs))
+    while stack:
+        expr = stack.pop()
+        if type(expr) is tuple:
+            code.append(expr)
+        elif type(expr) is Symbol or type(expr) is Keyword:
+            code.append(str(expr))
+        elif type(expr) is SchemeString:
+            code.append((expr.value,))
+        elif expr is nil:
+            code.append(None)
+        elif isinstance(expr, Pair):
+            items = []
+            while isinstance(expr, Pair):
+                items.append(expr.first)
+                expr = expr.second
+            dotted = expr is not nil
+            stack.append((len(items), dotted))
+            if dotted:
+                stack.append(expr)
+            stack.extend(reversed(items))
+        else:
+            code.append(expr)
+    return code
+
+def unflatten(code):
+    """Return the list of Scheme values rebuilt by the instructions CODE."""
+    values = []
+    for op in code:
+        if type(op) is tuple:
+            if len(op) == 1:
+                values.append(SchemeString(op[0]))
+                continue
+            n, dotted = op
+            result = values.pop() if dotted else nil
+            for _ in range(n):
+                result = Pair(values.pop(), result)
+            values.append(result)
+        elif type(op) is str:
+            values.append(Keyword(op) if op.startswith('#:') else Symbol(op))
+        elif op is None:
+            values.append(nil)
+        else:
+            values.append(op)
+    return values
+
+def _parse(text):
+    """Return the forms in the source TEXT, or None if reading it reports
+    any error or warning."""
+    forms = []
+    warnings = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(warnings):
+            src = buffer_text(text)
+            while True:
+                forms.append(scheme_read(src))
+    except EOFError:
+        pass
+    except (SyntaxError, ValueError):
+        return None
+    if warnings.getvalue():
+        return None
+    return forms
+
+def _read_cache(filename, key):
+    try:
+        with open(filename, 'rb') as infile:
+            data = infile.read()
+        header = _HEADER.unpack_from(data)
+        if header != (MAGIC, CACHE_VERSION) + key:
+            return None
+        return unflatten(marshal.loads(data[_HEADER.size:]))
+    except (OSError, EOFError, ValueError, TypeError, IndexError,
+            struct.error):
+        return None
+
+def _write_code(filename, key, code):
+    tmp = '{0}.{1}.tmp'.format(filename, os.getpid())
+    try:
+        with open(tmp, 'wb') as outfile:
+            outfile.write(_HEADER.pack(MAGIC, CACHE_VERSION, *key))
+            outfile.write(marshal.dumps(code))
+        os.replace(tmp, filename)
+    except (OSError, ValueError):
+        # An unwritable directory or an unmarshallable value; skip caching
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+
+def _source_key(filename):
+    """Return the source text of FILENAME as bytes and the key of its cache."""
+    with open(filename, 'rb') as infile:
+        data = infile.read()
+        stat = os.fstat(infile.fileno())
+    key = (stat.st_mtime_ns, stat.st_size, hashlib.sha256(data).digest())
+    return data, key
+
+def cached_forms(filename):
+    """Return a list of the top-level forms of the Scheme source FILENAME from
+    its cache, or None if there is no current cache."""
+    _, key = _source_key(filename)
+    return _read_cache(cache_filename(filename), key)
+
+class CacheWriter:
+    """Writes the cache of the Scheme source FILENAME from its forms, given to
+    ADD as they are read.  CLOSE writes the cache unless FAIL was called or an
+    invalid token was reported in the meantime.
+
+    >>> import tempfile
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'lib.scm')
+    >>> with open(filename, 'w') as outfile:
+    ...     _ = outfile.write("(define x 1) (f x)\\n")
+    >>> cached_forms(filename) is None
+    True
+    >>> writer = CacheWriter(filename)
+    >>> src = buffer_text("(define x 1) (f x)")
+    >>> while src.more_on_line:
+    ...     writer.add(scheme_read(src))
+    >>> writer.close()
+    >>> [str(form) for form in cached_forms(filename)]
+    ['(define x 1)', '(f x)']
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        _, self.key = _source_key(filename)
+        self.code = []
+        self.failed = False
+        self.warnings = scheme_tokens.warning_count
+
+    def add(self, form):
+        self.code.extend(flatten([form]))
+
+    def fail(self):
+        self.failed = True
+
+    def close(self):
+        if not self.failed and self.warnings == scheme_tokens.warning_count:
+            _write_code(cache_filename(self.filename), self.key, self.code)
+
+def read_forms(filename):
+    """Return a list of the top-level forms of the Scheme source FILENAME,
+    from its cache if that is current, and otherwise by parsing the file and
+    updating the cache.  Returns None if the file does not parse cleanly.
+
+    >>> import tempfile
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'lib.scm')
+    >>> with open(filename, 'w') as outfile:
+    ...     _ = outfile.write("(define x '(1 . 2)) ; comment\\n(f x)\\n")
+    >>> [str(form) for form in read_forms(filename)]
+    ['(define x (quote (1 . 2)))', '(f x)']
+    >>> os.path.exists(cache_filename(filename))
+    True
+    >>> [str(form) for form in read_forms(filename)]
+    ['(define x (quote (1 . 2)))', '(f x)']
+    >>> with open(cache_filename(filename), 'r+b') as cache:
+    ...     _ = cache.seek(_HEADER.size)
+    ...     _ = cache.write(b'garbage')
+    >>> [str(form) for form in read_forms(filename)]
+    ['(define x (quote (1 . 2)))', '(f x)']
+    """
+    data, key = _source_key(filename)
+    forms = _read_cache(cache_filename(filename), key)
+    if forms is None:
+        try:
+            text = data.decode()
+        except UnicodeDecodeError:
+            return None
+        forms = _parse(text)
+        if forms is not None:
+            _write_code(cache_filename(filename), key, flatten(forms))
+    return forms
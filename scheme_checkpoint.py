@@ -0,0 +1,118 @@
+"""This module journals the progress of long renders so that they can resume
+after a crash or preemption.
+
+A checkpoint file starts with a header line recording the render parameters
+and a hash of the program's source files, followed by one line per completed
+scanline holding its row number and base64-encoded rgb bytes.  Rows are
+appended every INTERVAL scanlines and synced to disk.  Resuming replays the
+journaled rows into a fresh image sink and continues after the last one, but
+only if the parameters and sources still match.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from scheme_primitives import SchemeError
+
+CHECKPOINT_VERSION = 1
+
+def source_hash(filenames):
+    """Return a hex digest of the contents of the files in FILENAMES."""
+    digest = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, 'rb') as infile:
+            digest.update(infile.read())
+    return digest.hexdigest()
+
+class Checkpoint:
+    """The journal of completed scanlines for a render with PARAMS, a dict of
+    JSON values, stored in FILENAME and synced every INTERVAL rows.
+
+    >>> import tempfile
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'render.ckpt')
+    >>> journal = Checkpoint(filename, {'width': 2}, interval=1)
+    >>> journal.restore(None, resume=True)
+    0
+    >>> journal.record(0, b'abcdef')
+    >>> rows = []
+    >>> class Sink:
+    ...     write_row = rows.append
+    >>> Checkpoint(filename, {'width': 2}).restore(Sink(), resume=True)
+    1
+    >>> rows
+    [b'abcdef']
+    >>> Checkpoint(filename, {'width': 3}).restore(Sink(), resume=True)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: checkpoint does not match this render: width was 2, now 3
+    """
+
+    def __init__(self, filename, params, interval=16):
+        self.filename = filename
+        self.params = params
+        self.interval = interval
+        self.pending = []
+        self.file = None
+
+    def _header(self):
+        return {'version': CHECKPOINT_VERSION, 'params': self.params}
+
+    def _check_header(self, header):
+        if header.get('version') != CHECKPOINT_VERSION:
+            raise SchemeError("checkpoint {0} has an unknown format".format(
+                self.filename))
+        old = header['params']
+        for key in sorted(set(old) | set(self.params)):
+            if old.get(key) != self.params.get(key):
+                raise SchemeError("checkpoint does not match this render: "
+                                  "{0} was {1}, now {2}".format(
+                                      key, old.get(key), self.params.get(key)))
+
+    def restore(self, sink, resume):
+        """Open the journal for writing.  If RESUME and a matching journal
+        exists, write its completed rows to SINK and return how many there
+        are; otherwise start a new journal and return 0."""
+        rows = 0
+        if resume and os.path.exists(self.filename):
+            with open(self.filename) as infile:
+                self._check_header(json.loads(infile.readline()))
+                for line in infile:
+                    if not line.endswith('\n'):
+                        break  # Truncated by a crash while writing
+                    y, data = line.split()
+                    if int(y) != rows:
+                        break
+                    sink.write_row(base64.b64decode(data))
+                    rows += 1
+            # Rewrite the journal, dropping any partial trailing record
+            tmp = self.filename + '.tmp'
+            with open(self.filename) as infile, open(tmp, 'w') as outfile:
+                outfile.write(infile.readline())
+                for _ in range(rows):
+                    outfile.write(infile.readline())
+            os.replace(tmp, self.filename)
+            self.file = open(self.filename, 'a')
+        else:
+            self.file = open(self.filename, 'w')
+            self.file.write(json.dumps(self._header(), sort_keys=True) + '\n')
+            self._sync()
+        return rows
+
+    def record(self, y, row):
+        """Journal the completed scanline ROW with row number Y."""
+        self.pending.append('{0} {1}\n'.format(
+            y, base64.b64encode(bytes(row)).decode()))
+        if len(self.pending) >= self.interval:
+            self._sync()
+
+    def _sync(self):
+        self.file.write(''.join(self.pending))
+        self.pending = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def finish(self):
+        """Remove the journal of a completed render."""
+        self.file.close()
+        os.remove(self.filename)
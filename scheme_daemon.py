@@ -0,0 +1,292 @@
+"""This module runs scheme.py as a daemon that loads the definitions of its
+programs once and then runs jobs sent to it over a Unix socket:
+
+    python3 scheme.py -daemon /tmp/scheme.sock -jobs 2 contest.scm
+
+A job is a JSON object on one line, with any of the fields
+
+    file    a Scheme file to load
+    params  globals to define, e.g. {"width": 64, "center": [-0.5, 0.5]}
+    expr    expressions to evaluate, e.g. "(draw)"
+    output  the image file returned by render-output
+
+which are used in that order.  The daemon answers each job with a JSON object
+on one line, holding the value of the last expression and what the job
+printed, or its error, along with the seconds that the job spent queued and
+running.  The job {"status": true} reports the number of jobs queued, running
+and done instead.  The same replies are printed by
+
+    python3 scheme_daemon.py /tmp/scheme.sock '{"expr": "(draw)"}'
+
+Jobs run in a pool of worker processes, at most one per worker (-jobs) at a
+time.  Each job gets its own copy of the preloaded global frame, restored
+from an image of it as by save-image, so jobs do not see each other's
+definitions.  With --watch, the daemon reloads the definitions of its files
+that change, as reload does, and later jobs use them.
+"""
+
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import stat
+import threading
+import time
+import scheme_parallel
+import scheme_reload
+import scheme_render
+import scheme_snapshot
+from scheme import *
+from ucb import main
+
+# The image of the preloaded global frame, in a worker process
+_image = None
+
+def _init_worker(image):
+    global _image
+    _image = image
+    scheme_parallel.options.workers = 1
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def scheme_value(value):
+    """Return the Scheme value of the JSON value VALUE.  Lists become vectors,
+    as for the center of contest.scm.
+
+    >>> print(scheme_value([-0.5, "a", None]))
+    #(-0.5 "a" ())
+    """
+    if value is None:
+        return nil
+    if isinstance(value, str):
+        return SchemeString(value)
+    if isinstance(value, list):
+        return Vector(scheme_value(item) for item in value)
+    if isinstance(value, dict):
+        raise SchemeError("cannot convert a JSON object to Scheme")
+    return value
+
+@contextlib.contextmanager
+def render_options(output, sources):
+    """Set the OUTPUT and SOURCES of renders for the duration of a job, and
+    restore the previous ones afterward.
+
+    >>> with render_options('frame.png', ['contest.scm']):
+    ...     print(scheme_render.scheme_render_output())
+    "frame.png"
+    >>> scheme_render.scheme_render_output()
+    False
+    """
+    options = scheme_render.options
+    saved = options.output, options.sources
+    options.output, options.sources = output, sources
+    try:
+        yield
+    finally:
+        options.output, options.sources = saved
+
+def run_job(job):
+    """Run the JOB dict in a new copy of the preloaded global frame, and
+    return the reply dict."""
+    env = create_global_frame()
+    env.bindings.update(scheme_snapshot.loads(_image, env))
+    sources = [job['file']] if 'file' in job else []
+    printed = io.StringIO()
+    value = okay
+    try:
+        with render_options(job.get('output'), sources), \
+             contextlib.redirect_stdout(printed):
+            if 'file' in job:
+                scheme_load(job['file'], True, env)
+            for name, param in job.get('params', {}).items():
+                env.define(name, scheme_value(param))
+            src = buffer_text(job.get('expr', ''))
+            while True:
+                try:
+                    expr = scheme_read(src)
+                except EOFError:
+                    break
+                value = scheme_eval(expr, env)
+    except Exception as err:
+        return {'ok': False, 'error': str(err), 'output': printed.getvalue()}
+    return {'ok': True, 'value': None if value is None else str(value),
+            'output': printed.getvalue()}
+
+class JobQueue:
+    """Runs jobs against copies of the global frame ENV in a pool of WORKERS
+    processes, and counts the jobs that are queued, running and done."""
+
+    def __init__(self, env, workers):
+        self.workers = workers
+        self.pool = self.start(env)
+        self.slots = threading.Semaphore(workers)
+        self.lock = threading.Lock()
+        self.queued = self.running = self.done = 0
+
+    def start(self, env):
+        image = scheme_snapshot.dumps(env.bindings, env)
+        return multiprocessing.Pool(self.workers, _init_worker, (image,))
+
+    def update(self, env):
+        """Run later jobs against copies of ENV, letting the jobs already
+        running finish in the previous workers."""
+        pool, self.pool = self.pool, self.start(env)
+        pool.close()
+
+    def status(self):
+        with self.lock:
+            return {'queued': self.queued, 'running': self.running,
+                    'done': self.done}
+
+    def run(self, job):
+        """Run JOB once a worker is free, and return its reply."""
+        submitted = time.time()
+        with self.lock:
+            self.queued += 1
+        with self.slots:
+            with self.lock:
+                self.queued -= 1
+                self.running += 1
+                depth = self.queued
+            started = time.time()
+            try:
+                reply = self.pool.apply(run_job, (job,))
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.done += 1
+        reply['queued'] = round(started - submitted, 3)
+        reply['time'] = round(time.time() - started, 3)
+        print("job: {0:.3f}s queued, {1:.3f}s running, {2} in queue".format(
+            reply['queued'], reply['time'], depth), flush=True)
+        return reply
+
+    def close(self):
+        self.pool.terminate()
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError("a job must be a JSON object")
+            except ValueError as err:
+                reply = {'ok': False, 'error': "bad job: {0}".format(err)}
+            else:
+                if job.get('status'):
+                    reply = self.server.jobs.status()
+                else:
+                    reply = self.server.jobs.run(job)
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def close(self):
+        """Stop accepting jobs, the workers and the socket."""
+        self.server_close()
+        os.unlink(self.server_address)
+        self.jobs.close()
+
+def make_server(path, env, workers):
+    """Return a server for jobs sent to the Unix socket PATH, replacing a
+    socket left there by a daemon that stopped.
+
+    >>> import tempfile
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line("(define (area) (* width height))"), env)
+    >>> path = os.path.join(tempfile.mkdtemp(), 'scheme.sock')
+    >>> server = make_server(path, env, 1)
+    >>> threading.Thread(target=server.serve_forever, daemon=True).start()
+    >>> job = {'params': {'width': 3, 'height': 4},
+    ...        'expr': '(display "hi")\\n(area)'}
+    >>> reply = submit(path, job) # doctest: +ELLIPSIS
+    job: ...
+    >>> reply['ok'], reply['value'], reply['output']
+    (True, '12', 'hi')
+    >>> submit(path, {'expr': '(area)'})['error'] # doctest: +ELLIPSIS
+    job: ...
+    'unknown identifier: width'
+    >>> submit(path, {'params': [1]})['error'] # doctest: +ELLIPSIS
+    job: ...
+    "'list' object has no attribute 'items'"
+    >>> submit(path, {'status': True})
+    {'queued': 0, 'running': 0, 'done': 3}
+    >>> server.shutdown(); server.close()
+    """
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+    server = _Server(path, _Handler)
+    server.jobs = JobQueue(env, workers)
+    return server
+
+def watch(files, env, jobs, interval=1.0):
+    """Reload the define forms of the Scheme source FILES into the global
+    frame ENV whenever they change, and update JOBS to use them."""
+    mtimes = {}
+    for filename in files:
+        with scheme_open(filename) as infile:
+            mtimes[infile.name] = os.stat(infile.name).st_mtime
+    while True:
+        time.sleep(interval)
+        changed = False
+        for filename, mtime in mtimes.items():
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime
+            except OSError:
+                continue
+            if mtimes[filename] == mtime:
+                continue
+            changed = True
+            try:
+                names = scheme_reload.reload_file(filename, env, True)
+                print("reloaded", filename + ":", *names, flush=True)
+            except Exception as err:
+                print("Error:", err, flush=True)
+        if changed:
+            try:
+                jobs.update(env)
+            except Exception as err:
+                print("Error:", err, flush=True)
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(path, env, workers, watched=()):
+    """Run jobs sent to the Unix socket PATH against copies of the global
+    frame ENV, in WORKERS processes, until interrupted or terminated.  The
+    definitions of the WATCHED files are reloaded when they change."""
+    server = make_server(path, env, workers)
+    signal.signal(signal.SIGTERM, _interrupt)
+    if watched:
+        threading.Thread(target=watch, args=(watched, env, server.jobs),
+                         daemon=True).start()
+    print("listening on", path, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+def submit(path, job):
+    """Send the JOB dict to the daemon listening on the Unix socket PATH, and
+    return its reply."""
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(job) + '\n').encode())
+        with sock.makefile() as replies:
+            return json.loads(replies.readline())
+
+@main
+def run(path, *jobs):
+    for job in jobs:
+        job = json.loads(job)
+        for field in ('file', 'output'):
+            if field in job:
+                job[field] = os.path.abspath(job[field])
+        print(json.dumps(submit(path, job)))
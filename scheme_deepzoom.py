@@ -0,0 +1,167 @@
+"""This module renders deep Mandelbrot zooms with perturbation theory.
+
+Past a zoom of about 1e-13, neighboring pixels of point-color in contest.scm
+are no longer distinct double-precision numbers.  Instead of iterating every
+pixel in arbitrary precision, one reference orbit Z is computed with Decimals
+and each pixel c = C + dc iterates only its small difference d from Z:
+
+    d' = 2·Z·d + d² + dc
+
+which stays accurate in double precision.  A pixel whose orbit comes too
+close to zero relative to the reference (|Z + d| < GLITCH_TOLERANCE·|Z|), or
+that outlives the reference orbit, is a glitch: it is recomputed against the
+nearest other reference, or else a new reference placed at that pixel.  Past
+MAX_REFERENCES, glitched pixels are iterated directly in high precision.
+
+The iteration and orbit traps mirror point-color, and the results are passed
+to the program's own colorize procedure.
+"""
+
+import decimal
+import math
+from decimal import Decimal
+from scheme import *
+
+GLITCH_TOLERANCE = 1e-3
+MAX_REFERENCES = 64
+
+# Constants of the line trap in point-color
+_LINE_TRAP_ORIGIN = 1j
+_LINE_TRAP_DIR = 0.707
+
+class ReferenceOrbit:
+    """The orbit of the point at offset DC (a complex double) from CENTER (a
+    pair of Decimals), computed with DIGITS significant digits and stored as
+    complex doubles.  The orbit stops after MAX_ITER steps, or once it leaves
+    the circle of squared radius ESCAPE_RADIUS.
+
+    >>> ref = ReferenceOrbit((Decimal(0), Decimal(1)), 0j, 3, 64, 30)
+    >>> ref.orbit
+    [0j, 1j, (-1+1j), -1j]
+    """
+
+    def __init__(self, center, dc, max_iter, escape_radius, digits):
+        self.dc = dc
+        with decimal.localcontext() as ctx:
+            ctx.prec = digits
+            cr = center[0] + Decimal(dc.real)
+            ci = center[1] + Decimal(dc.imag)
+            zr = zi = Decimal(0)
+            self.orbit = [0j]
+            for _ in range(max_iter):
+                zr, zi = zr * zr - zi * zi + cr, 2 * zr * zi + ci
+                self.orbit.append(complex(float(zr), float(zi)))
+                if zr * zr + zi * zi > escape_radius:
+                    break
+
+def _abs2(z):
+    return z.real * z.real + z.imag * z.imag
+
+def perturb(ref, dc, max_iter, escape_radius, trap_pos):
+    """Iterate the point at offset DC from the ReferenceOrbit REF, returning
+    the final z and dz along with point-color's dist-trap, point-trap and co2,
+    or None if the pixel glitched.
+
+    >>> ref = ReferenceOrbit((Decimal(-1), Decimal(0)), 0j, 5, 64, 30)
+    >>> z, dz, dist_trap, point_trap, co2 = perturb(ref, 0.25j, 5, 64, 2j)
+    >>> c = z2 = -1+0.25j
+    >>> for _ in range(4): z2 = z2 * z2 + c
+    >>> abs(z - z2) < 1e-12
+    True
+    """
+    orbit = ref.orbit
+    last = len(orbit) - 1
+    d = z = 0j
+    dz = 1+0j
+    dist_trap, point_trap, co2 = 0, 1e20, 0
+    i = 0
+    while not (_abs2(z) > escape_radius or i == max_iter):
+        if i == last:
+            return None
+        dz = 2 * z * dz + 1
+        d = (2 * orbit[i] + d) * d + dc
+        i += 1
+        ref_z = orbit[i]
+        z = ref_z + d
+        if _abs2(z) < GLITCH_TOLERANCE * GLITCH_TOLERANCE * _abs2(ref_z):
+            return None
+        w = z - _LINE_TRAP_ORIGIN
+        dist = abs((w.real + w.imag) * _LINE_TRAP_DIR)
+        if dist <= 1:
+            co2 += 1
+            dist_trap += dist
+        point_trap = min(point_trap, _abs2(z - trap_pos))
+    return z, dz, dist_trap, point_trap, co2
+
+class DeepZoomSampler:
+    """Samples pixels of a scheme_render Viewport with perturbation theory,
+    coloring them with the Scheme procedure COLORIZE of z, dz, dist-trap,
+    point-trap and co2.  The iteration limits and point trap position are read
+    from the globals max-iter, escape-radius and point-trap-pos of ENV."""
+
+    def __init__(self, colorize, env):
+        self.colorize = colorize
+        self.env = env
+
+    def begin_frame(self, view):
+        view.bind(self.env)
+        self.view = view
+        self.max_iter = self.env.lookup("max-iter")
+        self.escape_radius = self.env.lookup("escape-radius")
+        trap = self.env.lookup("point-trap-pos")
+        self.trap_pos = complex(trap[0], trap[1])
+        self.center = tuple(Decimal(c) for c in view.center)
+        self.digits = max(30, 20 - math.floor(math.log10(view.zoom)))
+        self.references = [self.reference(0j)]
+        self.last = self.references[0]
+        self.glitches = self.direct = 0
+
+    def reference(self, dc):
+        return ReferenceOrbit(self.center, dc, self.max_iter,
+                              self.escape_radius, self.digits)
+
+    def iterate(self, dc):
+        """Iterate the point at offset DC against a reference, trying the
+        last successful reference, the nearest one and the primary one in
+        turn, and adding a new one at DC when every candidate glitches.  Once
+        MAX_REFERENCES are in use, a glitched point is iterated against an
+        orbit of its own that is not kept."""
+        nearest = min(self.references, key=lambda ref: _abs2(dc - ref.dc))
+        candidates = [self.last]
+        for ref in (nearest, self.references[0]):
+            if ref not in candidates:
+                candidates.append(ref)
+        for ref in candidates:
+            result = perturb(ref, dc - ref.dc, self.max_iter,
+                             self.escape_radius, self.trap_pos)
+            if result is not None:
+                self.last = ref
+                return result
+        self.glitches += 1
+        ref = self.reference(dc)
+        if len(self.references) < MAX_REFERENCES:
+            self.references.append(ref)
+            self.last = ref
+        else:
+            self.direct += 1
+        return perturb(ref, 0j, self.max_iter, self.escape_radius,
+                       self.trap_pos)
+
+    def sample(self, x, y):
+        """Return the Scheme color at pixel (X, Y), along with the distance
+        estimate used by colorize if the point escaped, or None."""
+        dx, dy = self.view.offset(x, y)
+        z, dz, dist_trap, point_trap, co2 = self.iterate(complex(dx, dy))
+        args = scheme_list(Vector([z.real, z.imag]), Vector([dz.real, dz.imag]),
+                           dist_trap, point_trap, co2)
+        color = scheme_apply(self.colorize, args, self.env)
+        distance = None
+        if _abs2(z) > self.escape_radius:
+            # d(c) = |Z|·log|Z|/|Z'|, as in colorize
+            distance = (math.sqrt(_abs2(z) / (_abs2(dz) + 1e-30)) *
+                        math.log(_abs2(z) + 1e-30))
+        return color, distance
+
+    def summary(self):
+        return ", {0} references for {1} glitched pixels ({2} direct)".format(
+            len(self.references), self.glitches, self.direct)
@@ -0,0 +1,103 @@
+"""This module is the interface to the interpreter for Python programs.
+
+    interpreter = Interpreter()
+    interpreter.load('contest.scm', definitions_only=True)
+    color = interpreter.procedure('point-color')
+    rows = [[color(x, y) for x in range(64)] for y in range(64)]
+
+Unlike the read-eval-print loop, an Interpreter prints nothing and raises a
+SchemeError (or SyntaxError) for an error in the program.  Python arguments
+are converted to Scheme values once per call, and procedures are applied
+directly, without reading or evaluating any Scheme source.
+"""
+
+import scheme_snapshot
+from scheme import *
+
+def to_scheme(value):
+    """Return the Scheme value of the Python VALUE: strings become Scheme
+    strings, lists and tuples become Scheme lists, and other values, such as
+    numbers, vectors and procedures, are unchanged.
+
+    >>> print(to_scheme([1, "a", (2.5, True)]))
+    (1 "a" (2.5 True))
+    """
+    if type(value) is str:
+        return SchemeString(value)
+    if type(value) in (list, tuple):
+        return scheme_list(*[to_scheme(item) for item in value])
+    return value
+
+class Interpreter:
+    """A Scheme interpreter with its own global frame ENV, by default a new
+    one, or one restored from the image file IMAGE.
+
+    >>> interpreter = Interpreter()
+    >>> interpreter.eval_string("(define (norm v) (sqrt (apply + (map * v v))))"
+    ...                         "(norm '(3 4))")
+    5.0
+    >>> interpreter.call('norm', [5, 12])
+    13.0
+    >>> interpreter.eval_string("(define x 1)\\n(define y 2)\\n(+ x y)")
+    3
+    >>> interpreter.eval_string("(car 1)")
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: argument 0 of car has wrong type (int)
+    """
+
+    def __init__(self, env=None, image=None):
+        if env is None:
+            env = create_global_frame() if image is None else \
+                  scheme_snapshot.load_image(image)
+        self.env = env
+
+    def load(self, path, definitions_only=False):
+        """Evaluate the Scheme source file PATH, stopping at an error, or
+        only its top-level define forms if DEFINITIONS_ONLY."""
+        for expr in read_file(path):
+            if not definitions_only or scheme_definep(expr):
+                scheme_eval(expr, self.env)
+
+    def eval_string(self, src):
+        """Evaluate the expressions in the string SRC, and return the value
+        of the last one (or okay, if there are none)."""
+        value = okay
+        src = buffer_text(src)
+        while True:
+            try:
+                expr = scheme_read(src)
+            except EOFError:
+                return value
+            value = scheme_eval(expr, self.env)
+
+    def lookup(self, name):
+        """Return the value of the global NAME."""
+        return self.env.lookup(name)
+
+    def define(self, name, value):
+        """Bind the global NAME to the Python VALUE, converted to Scheme."""
+        self.env.define(name, to_scheme(value))
+
+    def procedure(self, name):
+        """Return a Python function that applies the Scheme procedure bound
+        to NAME now to its arguments, converted to Scheme.
+
+        >>> interpreter = Interpreter()
+        >>> add = interpreter.procedure('+')
+        >>> [add(x, 0.5) for x in range(3)]
+        [0.5, 1.5, 2.5]
+        """
+        procedure = self.lookup(name)
+        env = self.env
+        def call(*py_args):
+            args = nil
+            for arg in reversed(py_args):
+                args = Pair(to_scheme(arg), args)
+            return scheme_apply(procedure, args, env)
+        return call
+
+    def call(self, name, *py_args):
+        """Apply the Scheme procedure bound to NAME to PY_ARGS, converted to
+        Scheme, and return its value."""
+        return self.procedure(name)(*py_args)
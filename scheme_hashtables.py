@@ -0,0 +1,187 @@
+"""This module implements hash tables for Scheme programs, with the procedure
+names of SRFI 69, backed by Python dicts.
+
+Keys are compared with equal?, so lists, vectors and strings with the same
+elements are the same key.  Each key is converted to a hashable Python value
+that has its structure, which is computed when the key is used; a list or
+vector that is modified after it is stored is not found again.
+"""
+
+from scheme import *
+
+class HashTable:
+    """A Scheme hash table, whose TABLE maps the structural key of each Scheme
+    key to a (key, value) pair."""
+    __slots__ = ('table',)
+
+    def __init__(self):
+        self.table = {}
+
+    def __str__(self):
+        return '#[hash-table {0}]'.format(len(self.table))
+
+def hash_key(value):
+    """Return a hashable Python value that is equal for Scheme values that
+    are equal?.  Booleans are distinct from numbers, and lists are traversed
+    without recursion along their length.
+
+    >>> hash_key(read_line("(1 (2 #t) . x)"))
+    ('list', (1, ('list', (2, ('bool', True)), None)), 'x')
+    >>> hash_key(read_line("(1 2)")) == hash_key(scheme_list(1, 2))
+    True
+    >>> hash_key(scheme_vector(1, 2)) == hash_key(read_line("(1 2)"))
+    False
+    """
+    if type(value) is bool:
+        return ('bool', value)
+    if value is nil:
+        return None
+    if isinstance(value, Pair):
+        items = []
+        while isinstance(value, Pair):
+            items.append(hash_key(value.first))
+            value = value.second
+        return ('list', tuple(items), hash_key(value))
+    if isinstance(value, Vector):
+        return ('vector', tuple(hash_key(item) for item in value))
+    return value
+
+def _check_table(table, name):
+    return check_type(table, scheme_hash_tablep, 0, name)
+
+@primitive("make-hash-table")
+def scheme_make_hash_table():
+    return HashTable()
+
+@primitive("hash-table?")
+def scheme_hash_tablep(x):
+    return isinstance(x, HashTable)
+
+@primitive("hash-table-ref", use_env=True)
+def scheme_hash_table_ref(table, key, *rest):
+    """Return the value of KEY in TABLE, or else call the procedure given as
+    an optional third argument.
+
+    >>> env = create_global_frame()
+    >>> for line in ["(define t (make-hash-table))",
+    ...              "(hash-table-set! t '(1 \\"a\\") 2)"]:
+    ...     _ = scheme_eval(read_line(line), env)
+    >>> scheme_eval(read_line("(hash-table-ref t (list 1 \\"a\\"))"), env)
+    2
+    >>> scheme_eval(read_line("(hash-table-ref t 3 (lambda () 4))"), env)
+    4
+    >>> scheme_eval(read_line("(hash-table-ref t 3)"), env)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: hash-table-ref: key not found: 3
+    """
+    *thunk, env = rest
+    _check_table(table, "hash-table-ref")
+    entry = table.table.get(hash_key(key))
+    if entry is not None:
+        return entry[1]
+    if thunk:
+        return scheme_apply(thunk[0], nil, env)
+    raise SchemeError("hash-table-ref: key not found: {0}".format(key))
+
+@primitive("hash-table-ref/default")
+def scheme_hash_table_ref_default(table, key, default):
+    """Return the value of KEY in TABLE, or DEFAULT if it has none."""
+    _check_table(table, "hash-table-ref/default")
+    entry = table.table.get(hash_key(key))
+    return default if entry is None else entry[1]
+
+@primitive("hash-table-set!")
+def scheme_hash_table_set(table, key, value):
+    _check_table(table, "hash-table-set!")
+    table.table[hash_key(key)] = (key, value)
+
+@primitive("hash-table-update!", use_env=True)
+def scheme_hash_table_update(table, key, procedure, *rest):
+    """Set the value of KEY in TABLE to the result of calling PROCEDURE on its
+    value, which is that of the optional fourth argument, a procedure, for a
+    missing key."""
+    value = scheme_hash_table_ref(table, key, *rest)
+    *_, env = rest
+    value = scheme_apply(procedure, Pair(value, nil), env)
+    table.table[hash_key(key)] = (key, value)
+
+@primitive("hash-table-update!/default", use_env=True)
+def scheme_hash_table_update_default(table, key, procedure, default, env):
+    """Set the value of KEY in TABLE to the result of calling PROCEDURE on its
+    value, or on DEFAULT if it has none.
+
+    >>> env = create_global_frame()
+    >>> for line in ["(define t (make-hash-table))",
+    ...              "(for-each (lambda (c) (hash-table-update!/default t c"
+    ...              "  (lambda (n) (+ n 1)) 0)) '(a b a))"]:
+    ...     _ = scheme_eval(read_line(line), env)
+    >>> print(scheme_eval(read_line("(hash-table->alist t)"), env))
+    ((a . 2) (b . 1))
+    """
+    value = scheme_hash_table_ref_default(table, key, default)
+    value = scheme_apply(procedure, Pair(value, nil), env)
+    table.table[hash_key(key)] = (key, value)
+
+@primitive("hash-table-delete!")
+def scheme_hash_table_delete(table, key):
+    _check_table(table, "hash-table-delete!")
+    table.table.pop(hash_key(key), None)
+
+@primitive("hash-table-contains?", "hash-table-exists?")
+def scheme_hash_table_contains(table, key):
+    _check_table(table, "hash-table-contains?")
+    return hash_key(key) in table.table
+
+@primitive("hash-table-size", "hash-table-count")
+def scheme_hash_table_size(table):
+    _check_table(table, "hash-table-size")
+    return len(table.table)
+
+@primitive("hash-table-clear!")
+def scheme_hash_table_clear(table):
+    _check_table(table, "hash-table-clear!")
+    table.table.clear()
+
+@primitive("hash-table-copy")
+def scheme_hash_table_copy(table):
+    _check_table(table, "hash-table-copy")
+    result = HashTable()
+    result.table.update(table.table)
+    return result
+
+def _entries(table, name):
+    """Return a list of the (key, value) pairs of TABLE, in insertion order,
+    so that the table can be modified while they are visited."""
+    return list(_check_table(table, name).table.values())
+
+@primitive("hash-table-keys")
+def scheme_hash_table_keys(table):
+    return scheme_list(*[key for key, _ in _entries(table, "hash-table-keys")])
+
+@primitive("hash-table-values")
+def scheme_hash_table_values(table):
+    return scheme_list(*[value for _, value in
+                         _entries(table, "hash-table-values")])
+
+@primitive("hash-table->alist")
+def scheme_hash_table_to_alist(table):
+    return scheme_list(*[Pair(key, value) for key, value in
+                         _entries(table, "hash-table->alist")])
+
+@primitive("hash-table-walk", use_env=True)
+def scheme_hash_table_walk(table, procedure, env):
+    """Call PROCEDURE on each key and value of TABLE."""
+    for key, value in _entries(table, "hash-table-walk"):
+        scheme_apply(procedure, Pair(key, Pair(value, nil)), env)
+    return okay
+
+@primitive("hash-table-fold", use_env=True)
+def scheme_hash_table_fold(table, kons, knil, env):
+    """Combine the entries of TABLE by calling (KONS key value accumulator),
+    starting with KNIL."""
+    result = knil
+    for key, value in _entries(table, "hash-table-fold"):
+        result = scheme_apply(kons, Pair(key, Pair(value, Pair(result, nil))),
+                              env)
+    return result
@@ -0,0 +1,204 @@
+"""This module converts Scheme color values to pixels and streams images to
+disk as PPM or PNG files, one scanline at a time, without going through the
+turtle canvas."""
+
+import os
+import struct
+import zlib
+from scheme_primitives import *
+
+def _channel(val):
+    """Convert a color channel in 0.0 - 1.0 to a byte, clamping if needed."""
+    if not scheme_numberp(val):
+        raise SchemeError("color channel ({0}) is not a number".format(val))
+    return int(round(255 * min(max(val, 0), 1)))
+
+def scheme_rgb(color):
+    """Return the (r, g, b) bytes of the Scheme color COLOR, which is either a
+    vector or list of three channels, or a number for a shade of gray.  This
+    accepts the same numeric colors as the color primitive.
+
+    >>> from scheme_primitives import Vector
+    >>> scheme_rgb(Vector([1, 0.5, 0]))
+    (255, 128, 0)
+    >>> scheme_rgb(0.25)
+    (64, 64, 64)
+    """
+    if scheme_numberp(color):
+        return (_channel(color),) * 3
+    if scheme_vectorp(color) or scheme_listp(color):
+        channels = tuple(_channel(c) for c in color)
+        if len(channels) == 3:
+            return channels
+    raise SchemeError("cannot convert {0} to an rgb color".format(color))
+
+class ImageSink:
+    """A streaming image sink accepts scanlines of rgb bytes as they are
+    completed and writes them to a file, so memory use does not grow with the
+    image height and a partial render is already usable on disk."""
+
+    def __str__(self):
+        return '#[image-sink]'
+
+    def _check_row(self, row):
+        if len(row) != 3 * self.width:
+            raise ValueError("row has {0} bytes, not {1}".format(len(row),
+                                                                 3 * self.width))
+        if self.rows_written == self.height:
+            raise ValueError("image already has {0} rows".format(self.height))
+        self.rows_written += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        """Close the file unfinished, renaming it with a .partial suffix so
+        that it is not mistaken for a complete image."""
+        self.file.close()
+        os.replace(self.filename, self.filename + '.partial')
+
+class PPMSink(ImageSink):
+    """A streaming image sink for binary PPM files."""
+
+    def __init__(self, filename, width, height):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.filename = filename
+        self.file = open(filename, 'wb')
+        self.file.write('P6\n{0} {1}\n255\n'.format(width, height).encode())
+
+    def write_row(self, row):
+        """Append the next scanline ROW, 3 * WIDTH channel values."""
+        self._check_row(row)
+        self.file.write(bytes(row))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def _png_chunk(tag, data):
+    """Return the bytes of a PNG chunk with type TAG holding DATA."""
+    crc = zlib.crc32(tag + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', crc)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+class PNGSink(ImageSink):
+    """A streaming image sink for 8-bit RGB PNG files.  Scanlines are
+    compressed through a single zlib stream, and every BAND rows are flushed
+    to disk as one IDAT chunk.
+
+    >>> import os, tempfile
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'image.png')
+    >>> with PNGSink(filename, 2, 3, band=2) as sink:
+    ...     for y in range(3):
+    ...         sink.write_row(bytes([y] * 6))
+    >>> data = open(filename, 'rb').read()
+    >>> data.count(b'IDAT')
+    2
+    >>> raw = zlib.decompress(b''.join(_png_data(data)))
+    >>> len(raw), raw[14:]
+    (21, b'\\x00\\x02\\x02\\x02\\x02\\x02\\x02')
+    >>> with PNGSink(filename, 2, 3) as sink:
+    ...     sink.write_row(bytes(5))
+    Traceback (most recent call last):
+        ...
+    ValueError: row has 5 bytes, not 6
+    >>> os.path.exists(filename), os.path.exists(filename + '.partial')
+    (False, True)
+    """
+
+    def __init__(self, filename, width, height, band=16):
+        self.width = width
+        self.height = height
+        self.band = band
+        self.rows_written = 0
+        self.pending = bytearray()
+        self.compressor = zlib.compressobj()
+        self.filename = filename
+        self.file = open(filename, 'wb')
+        header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+        self.file.write(PNG_SIGNATURE)
+        self.file.write(_png_chunk(b'IHDR', header))
+
+    def write_row(self, row):
+        """Append the next scanline ROW, 3 * WIDTH channel values."""
+        self._check_row(row)
+        self.pending.append(0) # Filter type: None
+        self.pending.extend(row)
+        if self.rows_written % self.band == 0:
+            self._write_band(zlib.Z_SYNC_FLUSH)
+
+    def _write_band(self, mode):
+        data = self.compressor.compress(bytes(self.pending))
+        data += self.compressor.flush(mode)
+        self.pending = bytearray()
+        self.file.write(_png_chunk(b'IDAT', data))
+        self.file.flush()
+
+    def close(self):
+        if self.compressor is not None:
+            self._write_band(zlib.Z_FINISH)
+            self.compressor = None
+            self.file.write(_png_chunk(b'IEND', b''))
+        self.file.close()
+
+def _png_data(data):
+    """Yield the contents of the IDAT chunks in the PNG file bytes DATA."""
+    k = len(PNG_SIGNATURE)
+    while k < len(data):
+        length, tag = struct.unpack('>I4s', data[k:k+8])
+        if tag == b'IDAT':
+            yield data[k+8:k+8+length]
+        k += 12 + length
+
+def open_sink(filename, width, height):
+    """Return a streaming image sink for FILENAME, writing a PPM file if it
+    ends with .ppm and a PNG file otherwise."""
+    if filename.lower().endswith('.ppm'):
+        return PPMSink(filename, width, height)
+    return PNGSink(filename, width, height)
+
+##
+## Image file primitives (non-standard)
+##
+
+@primitive("image-open")
+def scheme_image_open(filename, width, height):
+    """Open a streaming image sink for a WIDTH by HEIGHT image file."""
+    filename = check_filename(filename, 0, "image-open")
+    check_type(width, scheme_integerp, 1, "image-open")
+    check_type(height, scheme_integerp, 2, "image-open")
+    try:
+        return open_sink(filename, width, height)
+    except IOError as exc:
+        raise SchemeError(str(exc))
+
+def _check_sink(sink, k, name):
+    return check_type(sink, lambda x: isinstance(x, ImageSink), k, name)
+
+@primitive("image-write-row!")
+def scheme_image_write_row(sink, colors):
+    """Append a scanline of COLORS, a vector or list of colors, to SINK."""
+    _check_sink(sink, 0, "image-write-row!")
+    row = bytearray()
+    for color in colors:
+        row.extend(scheme_rgb(color))
+    try:
+        sink.write_row(row)
+    except ValueError as exc:
+        raise SchemeError(str(exc))
+    return okay
+
+@primitive("image-close")
+def scheme_image_close(sink):
+    _check_sink(sink, 0, "image-close")
+    sink.close()
+    return okay
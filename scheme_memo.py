@@ -0,0 +1,131 @@
+"""This module implements the bounded caches of memoized Scheme procedures.
+
+A cache maps the structural keys of argument lists to results.  It holds at
+most CAPACITY entries (or any number, if CAPACITY is None), and evicts the
+least recently used entry (policy lru) or the least frequently used one
+(policy lfu, with ties broken by least recent use) to make room.  Both
+policies take constant time per lookup.
+"""
+
+from collections import OrderedDict
+
+# The result of looking up a key that is not cached
+MISSING = object()
+
+class LRUCache:
+    """A cache that evicts its least recently used entry.
+
+    >>> cache = LRUCache(2)
+    >>> cache.put('a', 1); cache.put('b', 2)
+    >>> cache.get('a')
+    1
+    >>> cache.put('c', 3)
+    >>> cache.get('b') is MISSING, list(cache.entries)
+    (True, ['a', 'c'])
+    >>> cache.hits, cache.misses, cache.evictions
+    (1, 1, 1)
+    """
+    policy = 'lru'
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the value cached for KEY, or MISSING."""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Cache VALUE for KEY, evicting an entry if the cache is full."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if self.capacity is not None and len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+class LFUCache:
+    """A cache that evicts its least frequently used entry.  Keys that have
+    been used the same number of times are kept in buckets in order of use.
+
+    >>> cache = LFUCache(2)
+    >>> cache.put('a', 1); cache.put('b', 2)
+    >>> cache.get('a'), cache.get('a')
+    (1, 1)
+    >>> cache.put('c', 3)
+    >>> cache.get('b') is MISSING, sorted(cache.entries)
+    (True, ['a', 'c'])
+    """
+    policy = 'lfu'
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.entries = {}
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _touch(self, key):
+        count = self.counts[key]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+        self.counts[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def get(self, key):
+        """Return the value cached for KEY, or MISSING."""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._touch(key)
+        return value
+
+    def put(self, key, value):
+        """Cache VALUE for KEY, evicting an entry if the cache is full."""
+        if key in self.entries:
+            self.entries[key] = value
+            self._touch(key)
+            return
+        if self.capacity is not None and len(self.entries) >= self.capacity:
+            if self.capacity == 0:
+                return
+            bucket = self.buckets[self.min_count]
+            evicted, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_count]
+            del self.entries[evicted], self.counts[evicted]
+            self.evictions += 1
+        self.entries[key] = value
+        self.counts[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_count = 1
+
+    def clear(self):
+        self.entries.clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.min_count = 0
+
+POLICIES = {cache.policy: cache for cache in (LRUCache, LFUCache)}
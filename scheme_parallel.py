@@ -0,0 +1,255 @@
+"""This module evaluates Scheme procedures in parallel, in a pool of worker
+processes that each run their own interpreter.
+
+The bindings of the global frame are pickled, as by save-image, into an image
+that is numbered with a version and stored in a directory shared with the
+workers.  Each parallel operation pickles the bindings again to see whether
+they changed, and stores a new version only if they did.  Its tasks carry
+the version, along with a procedure and its arguments (or an expression and
+its local frames) that refer to the global frame and the primitives by name.
+A worker restores an image only when its tasks move to a new version, so the
+workers see the program's state as it was when the operation began.  A
+future bound in the global frame is pickled as its value, waiting for it if
+necessary.  Only procedures without side effects on the program's state give
+the same results in parallel as in sequence.
+
+Errors in a worker are reported to the caller as a SchemeError.  Inside a
+worker, or with a single worker, everything is evaluated in sequence.
+"""
+
+import atexit
+import collections
+import multiprocessing
+import os
+import shutil
+import tempfile
+import scheme_snapshot
+from scheme import *
+
+class ParallelOptions:
+    """Settings for the worker pool, given on the command line of scheme.py.
+    WORKERS is the number of worker processes, by default one per CPU."""
+
+    def __init__(self):
+        self.workers = os.cpu_count() or 1
+
+options = ParallelOptions()
+
+# The pool, its number of workers and the directory of its images, in the
+# main process
+_pool = None
+_pool_workers = None
+_image_dir = None
+
+# The current image, its version, and the number of unfinished futures that
+# use each older version, in the main process
+_image = None
+_version = 0
+_futures = collections.Counter()
+
+# The directory of images of a worker process, or None in the main process,
+# and the version and global frame it restored last
+_worker_dir = None
+_worker_version = None
+_worker_env = None
+
+def _image_file(directory, version):
+    return os.path.join(directory, '{0}.img'.format(version))
+
+def _init_worker(directory):
+    global _worker_dir
+    _worker_dir = directory
+
+def _worker_frame(version):
+    """Return the global frame of this worker, restored from the image
+    VERSION unless it was already."""
+    global _worker_version, _worker_env
+    if version != _worker_version:
+        with open(_image_file(_worker_dir, version), 'rb') as infile:
+            image = infile.read()
+        env = create_global_frame()
+        env.bindings.update(scheme_snapshot.loads(image, env))
+        _worker_version, _worker_env = version, env
+    return _worker_env
+
+def _evaluate(task, env):
+    """Return the list of values computed by TASK: ('eval', expr, frame) or
+    ('map', procedure, items)."""
+    if task[0] == 'eval':
+        return [scheme_eval(task[1], task[2])]
+    procedure = task[1]
+    return [scheme_apply(procedure, Pair(item, nil), env) for item in task[2]]
+
+def _run(job):
+    """Evaluate a pickled task in a worker against an image of the global
+    bindings, given as the JOB (version, task), returning (True, pickled
+    results) or (False, an error message)."""
+    version, data = job
+    try:
+        env = _worker_frame(version)
+        task = scheme_snapshot.loads(data, env)
+        results = _evaluate(task, env)
+        return True, scheme_snapshot.dumps(results, env)
+    except Exception as err:
+        return False, str(err)
+
+def _close_pool():
+    global _pool, _image_dir, _image
+    if _pool is not None:
+        _pool.terminate()
+        shutil.rmtree(_image_dir, ignore_errors=True)
+        _pool = _image_dir = _image = None
+
+def _publish(env):
+    """Store a new version of the image of the bindings of the global frame
+    ENV if they changed since the last one, remove the older versions that no
+    unfinished future uses, and return the current version."""
+    global _image, _version
+    image = scheme_snapshot.dumps(env.bindings, env)
+    if image != _image:
+        _version += 1
+        with open(_image_file(_image_dir, _version), 'wb') as outfile:
+            outfile.write(image)
+        for name in os.listdir(_image_dir):
+            version = int(name.split('.')[0])
+            if version != _version and not _futures[version]:
+                os.remove(os.path.join(_image_dir, name))
+        _image = image
+    return _version
+
+def worker_pool(env):
+    """Return the pool of workers and the version of the image of the
+    bindings of the global frame ENV that its tasks use, or None if tasks
+    should be evaluated in this process."""
+    global _pool, _pool_workers, _image_dir
+    if _worker_dir is not None or options.workers <= 1:
+        return None
+    if _pool is None or _pool_workers != options.workers:
+        _close_pool()
+        _image_dir = tempfile.mkdtemp(prefix='scheme-images-')
+        _pool = multiprocessing.Pool(options.workers, _init_worker,
+                                     (_image_dir,))
+        _pool_workers = options.workers
+    return _pool, _publish(env)
+
+atexit.register(_close_pool)
+
+def _results(outcome, env):
+    ok, data = outcome
+    if not ok:
+        raise SchemeError(data)
+    return scheme_snapshot.loads(data, env)
+
+def parallel_map(procedure, items, env):
+    """Return a list of the results of applying PROCEDURE to each of ITEMS,
+    in order, computed by the worker pool of the global frame of ENV."""
+    env = env.global_frame()
+    pool = worker_pool(env)
+    if pool is None:
+        return _evaluate(('map', procedure, items), env)
+    pool, version = pool
+    size = max(1, -(-len(items) // (4 * options.workers)))
+    tasks = [scheme_snapshot.dumps(('map', procedure, items[i:i + size]), env)
+             for i in range(0, len(items), size)]
+    results = []
+    for outcome in pool.imap(_run, [(version, task) for task in tasks]):
+        results.extend(_results(outcome, env))
+    return results
+
+class Future:
+    """The value of an expression being evaluated by a worker against the
+    image VERSION, which is available once RESULT, a multiprocessing
+    AsyncResult, is ready."""
+
+    def __init__(self, result, env, version=None):
+        self.result = result
+        self.env = env
+        self.version = version
+        self.done = False
+        self.value = None
+
+    def __str__(self):
+        return "#[future]"
+
+    def __getstate__(self):
+        self.wait()
+        return self.__dict__
+
+    def wait(self):
+        """Wait for the outcome of the evaluation, which replaces RESULT."""
+        if not self.done and not isinstance(self.result, tuple):
+            self.result = self.result.get()
+            _futures[self.version] -= 1
+
+    def touch(self):
+        """Wait for the value of this future and return it."""
+        if not self.done:
+            self.wait()
+            self.value = _results(self.result, self.env)[0]
+            self.done, self.result, self.env = True, None, None
+        return self.value
+
+def do_future_form(vals, env):
+    """Evaluate a future form with parameters VALS in environment ENV, which
+    starts evaluating its expression in a worker and returns a Future."""
+    check_form(vals, 1, 1)
+    global_env = env.global_frame()
+    pool = worker_pool(global_env)
+    if pool is None:
+        future = Future(None, None)
+        future.value, future.done = scheme_eval(vals.first, env), True
+        return future
+    pool, version = pool
+    task = scheme_snapshot.dumps(('eval', vals.first, env), global_env)
+    _futures[version] += 1
+    return Future(pool.apply_async(_run, ((version, task),)), global_env,
+                  version)
+
+@primitive("touch")
+def scheme_touch(value):
+    """Return the value of the future VALUE, waiting for it if necessary, or
+    VALUE if it is not a future."""
+    return value.touch() if isinstance(value, Future) else value
+
+@primitive("parallel-map", use_env=True)
+def scheme_parallel_map(f, lst, env):
+    """Return a list of the results of applying F to the elements of LST, in
+    parallel.
+
+    >>> env = create_global_frame()
+    >>> workers, options.workers = options.workers, 2
+    >>> _ = scheme_eval(read_line("(define (sq x) (* x x))"), env)
+    >>> print(scheme_eval(read_line("(parallel-map sq '(1 2 3))"), env))
+    (1 4 9)
+    >>> _ = scheme_eval(read_line("(define v (vector 1 2))"), env)
+    >>> get = read_line("(parallel-map (lambda (i) (vector-ref v i)) '(0 1))")
+    >>> print(scheme_eval(get, env))
+    (1 2)
+    >>> _ = scheme_eval(read_line("(vector-set! v 0 5)"), env)
+    >>> print(scheme_eval(get, env))
+    (5 2)
+    >>> _ = scheme_eval(read_line("(define-record-type point (make-point x y) "
+    ...                           "point? (x point-x) (y point-y))"), env)
+    >>> _ = scheme_eval(read_line("(define ps (parallel-map (lambda (i) "
+    ...                           "(make-point i i)) '(1 2 3)))"), env)
+    >>> _ = scheme_eval(read_line("(define f (future (make-point 4 5)))"), env)
+    >>> print(scheme_eval(read_line("(cons (point-y (touch f)) "
+    ...                             "(map point? (cons (touch f) ps)))"), env))
+    (5 True True True True)
+    >>> print(scheme_eval(read_line("(parallel-map point-x ps)"), env))
+    (1 2 3)
+    >>> scheme_eval(read_line("(parallel-map car '(1))"), env)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: argument 0 of car has wrong type (int)
+    >>> options.workers = workers; _close_pool()
+    """
+    check_type(lst, scheme_listp, 1, "parallel-map")
+    return scheme_list(*parallel_map(f, list(lst), env))
+
+@primitive("parallel-vector-map", use_env=True)
+def scheme_parallel_vector_map(f, vec, env):
+    """Return a vector of the results of applying F to the elements of VEC,
+    in parallel."""
+    check_type(vec, scheme_vectorp, 1, "parallel-vector-map")
+    return Vector(parallel_map(f, list(vec), env))
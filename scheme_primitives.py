@@ -4,8 +4,7 @@ import math
 import random
 import operator
 import sys
-from scheme_reader import Pair, nil
-import scheme
+from scheme_reader import Pair, ArrayList, nil, Symbol, SchemeString, Keyword
 
 try:
     import turtle
@@ -20,6 +19,9 @@ class okay:
     def __repr__(self):
         return "okay"
 
+    def __reduce__(self):
+        return 'okay'
+
 okay = okay() # Assignment hides the okay class; there is only one instance
 
 ########################
@@ -47,6 +49,35 @@ def primitive(*names, use_env=False):
         return fn
     return add
 
+# The primitives with unchecked versions, as (procedure, checked function,
+# unchecked function)
+_UNCHECKED = []
+
+def unchecked(name):
+    """An annotation that registers a Python function as the unchecked version
+    of the primitive NAME, which assumes valid arguments."""
+    def add(fn):
+        for prim_name, proc in _PRIMITIVES:
+            if prim_name == name:
+                _UNCHECKED.append((proc, proc.fn, fn))
+        return fn
+    return add
+
+def use_unchecked_primitives(flag):
+    """Make the primitives with unchecked versions use them if FLAG, or their
+    checked versions otherwise, in every environment.
+
+    >>> proc = [proc for name, proc in _PRIMITIVES if name == "+"][0]
+    >>> use_unchecked_primitives(True)
+    >>> proc.fn(1, 2.0)
+    3
+    >>> use_unchecked_primitives(False)
+    >>> proc.fn is scheme_add
+    True
+    """
+    for proc, checked_fn, unchecked_fn in _UNCHECKED:
+        proc.fn = unchecked_fn if flag else checked_fn
+
 def add_primitives(frame):
     """Enter bindings in _PRIMITIVES into FRAME, an environment frame."""
     for name, proc in _PRIMITIVES:
@@ -60,6 +91,14 @@ def check_type(val, predicate, k, name):
         raise SchemeError(msg.format(k, name, type(val).__name__))
     return val
 
+def check_filename(val, k, name):
+    """Returns the file name given by VAL, a symbol, Scheme string or Python
+    str.  Raises a SchemeError for other values, using "argument K of NAME"
+    to describe them."""
+    if type(val) is SchemeString:
+        return val.value
+    return str(check_type(val, lambda x: isinstance(x, str), k, name))
+
 @primitive("boolean?")
 def scheme_booleanp(x):
     return x is True or x is False
@@ -92,9 +131,14 @@ def scheme_nullp(x):
 def scheme_listp(x):
     """Return whether x is a well-formed list. Assumes no cycles."""
     while x is not nil:
-        if not isinstance(x, Pair):
+        if type(x) is Pair:
+            x = x.second
+        elif type(x) is ArrayList:
+            x = x.tail
+        elif isinstance(x, Pair):
+            x = x.second
+        else:
             return False
-        x = x.second
     return True
 
 @primitive("dotted-list?")
@@ -102,10 +146,9 @@ def scheme_dottedp(x):
     """Return whether x is a dotted-list"""
     if not isinstance(x, Pair):
         return True
-    elif x.second is nil:
-        return False
-    else:
-        return scheme_dottedp(x.second)
+    while isinstance(x, Pair):
+        x = x.tail if type(x) is ArrayList else x.second
+    return x is not nil
 
 @primitive("length")
 def scheme_length(x):
@@ -128,14 +171,20 @@ def scheme_cdr(x):
     check_type(x, scheme_pairp, 0, 'cdr')
     return x.second
 
+def check_mutable(pair, name):
+    """Check that PAIR is a pair that may be modified by NAME."""
+    check_type(pair, scheme_pairp, 0, name)
+    if isinstance(pair, ArrayList):
+        raise SchemeError("{0}: cannot modify a literal list".format(name))
+
 @primitive("set-car!")
 def scheme_set_car(pair, x):
-    check_type(pair, scheme_pairp, 0, 'set-car!')
+    check_mutable(pair, 'set-car!')
     pair.first = x
 
 @primitive("set-cdr!")
 def scheme_set_car(pair, x):
-    check_type(pair, scheme_pairp, 0, 'set-cdr!')
+    check_mutable(pair, 'set-cdr!')
     pair.second = x
 
 @primitive("list")
@@ -154,13 +203,16 @@ def scheme_append(*vals):
         v = vals[i]
         if v is not nil:
             check_type(v, scheme_pairp, i, "append")
-            r = p = Pair(v.first, result)
-            v = v.second
+            items = []
             while scheme_pairp(v):
-                p.second = Pair(v.first, result)
-                p = p.second
-                v = v.second
-            result = r
+                if type(v) is ArrayList:
+                    items.extend(v.elements())
+                    v = v.tail
+                else:
+                    items.append(v.first)
+                    v = v.second
+            for item in reversed(items):
+                result = Pair(item, result)
     return result
 
 class Vector(list):
@@ -169,7 +221,8 @@ class Vector(list):
 
 # Warning
 ###########
-# Vector ops don't do type-checking for speed reasons !!
+# Vector ops check their arguments only with scheme.py --safety=2 (the
+# default); the unchecked versions are below the arithmetic operations.
 
 @primitive("make-vector")
 def scheme_make_vector(k, fill=None):
@@ -217,11 +270,15 @@ def scheme_vector_copy(vec):
 
 @primitive("string?")
 def scheme_stringp(x):
-    return isinstance(x, str) and x.startswith('"')
+    return type(x) is SchemeString
 
 @primitive("symbol?")
 def scheme_symbolp(x):
-    return isinstance(x, str) and not scheme_stringp(x)
+    return type(x) is Symbol
+
+@primitive("keyword?")
+def scheme_keywordp(x):
+    return type(x) is Keyword
 
 @primitive("number?")
 def scheme_numberp(x):
@@ -372,6 +429,51 @@ def scheme_zerop(x):
     _check_nums(x)
     return x == 0
 
+##
+## Unchecked versions (scheme.py --safety=1 or 0)
+##
+
+# These skip the type and bounds checks above.  Errors that Python reports
+# still become SchemeErrors in apply_primitive, but negative vector indices
+# count from the end and = compares any values.
+
+def _exact(s):
+    return round(s) if round(s) == s else s
+
+@unchecked("+")
+def _unchecked_add(*vals):
+    return _exact(sum(vals))
+
+@unchecked("-")
+def _unchecked_sub(val0, *vals):
+    if not vals:
+        return -val0
+    for val in vals:
+        val0 -= val
+    return _exact(val0)
+
+@unchecked("*")
+def _unchecked_mul(*vals):
+    return _exact(math.prod(vals))
+
+@unchecked("/")
+def _unchecked_div(val0, val1):
+    try:
+        return _exact(val0 / val1)
+    except ZeroDivisionError as err:
+        raise SchemeError(err)
+
+for _name, _fn in [("=", operator.eq), ("<", operator.lt),
+                   (">", operator.gt), ("<=", operator.le),
+                   (">=", operator.ge), ("abs", abs), ("sqrt", math.sqrt),
+                   ("log", math.log), ("expt", math.pow),
+                   ("floor", math.floor), ("ceil", math.ceil),
+                   ("sin", math.sin), ("cos", math.cos), ("tan", math.tan),
+                   ("vector-ref", operator.getitem),
+                   ("vector-set!", operator.setitem),
+                   ("vector-length", len)]:
+    unchecked(_name)(_fn)
+
 ##
 ## Other operations
 ##
@@ -391,7 +493,7 @@ def scheme_atomp(x):
 @primitive("display")
 def scheme_display(val):
     if scheme_stringp(val):
-        val = eval(val)
+        val = val.value
     print(str(val), end="")
     return okay
 
@@ -549,8 +651,8 @@ def tscheme_color(c):
     elif scheme_numberp(c):
         turtle.color([c, c, c])
     else:
-        c = eval(c)
-        turtle.color(c)
+        check_type(c, scheme_stringp, 0, "color")
+        turtle.color(c.value)
     return okay
 
 @primitive("begin_fill")
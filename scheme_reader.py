@@ -4,7 +4,9 @@ with a parser for Scheme expressions.
 In addition to the types defined in this file, some data types in Scheme are
 represented by their corresponding type in Python:
     number:       int or float
-    symbol:       string
+    symbol:       Symbol, a subclass of str (see scheme_tokens)
+    string:       SchemeString (see scheme_tokens)
+    keyword:      Keyword, a subclass of str (see scheme_tokens)
     boolean:      bool
     unspecified:  None
 
@@ -16,7 +18,8 @@ would be read to the value, where possible.
 """
 
 from ucb import main, trace, interact
-from scheme_tokens import tokenize_lines, DELIMITERS
+from scheme_tokens import tokenize_lines, TextTokenizer, LineTokenizer
+from scheme_tokens import Symbol, SchemeString, Keyword, DELIMITERS
 from buffer import Buffer, InputReader, LineReader
 
 # Pairs and Scheme lists
@@ -38,6 +41,8 @@ class Pair:
     >>> print(s.map(lambda x: x+4))
     (5 6)
     """
+    __slots__ = ('first', 'second')
+
     def __init__(self, first, second):
         self.first = first
         self.second = second
@@ -46,14 +51,17 @@ class Pair:
         return "Pair({0}, {1})".format(repr(self.first), repr(self.second))
 
     def __str__(self):
-        s = "(" + str(self.first)
-        second = self.second
-        while isinstance(second, Pair):
-            s += " " + str(second.first)
-            second = second.second
-        if second is not nil:
-            s += " . " + str(second)
-        return s + ")"
+        parts, rest = [], self
+        while isinstance(rest, Pair):
+            if type(rest) is ArrayList:
+                parts.extend(map(str, rest.elements()))
+                rest = rest.tail
+            else:
+                parts.append(str(rest.first))
+                rest = rest.second
+        if rest is not nil:
+            parts.append(". " + str(rest))
+        return "(" + " ".join(parts) + ")"
 
     def __len__(self):
         n, second = 1, self.second
@@ -78,22 +86,37 @@ class Pair:
 
     def __iter__(self):
         curr = self
-        while curr != nil:
+        while isinstance(curr, Pair):
             yield curr.first
             curr = curr.second
+        if curr is not nil:
+            raise TypeError("ill-formed list")
 
     def __eq__(self, p):
-        if not isinstance(p, Pair):
+        x, y = self, p
+        while isinstance(x, Pair) and isinstance(y, Pair):
+            if x is y:
+                return True
+            if not x.first == y.first:
+                return False
+            x, y = x.second, y.second
+        if isinstance(x, Pair) or isinstance(y, Pair):
             return False
-        return self.first == p.first and self.second == p.second
+        return x == y
 
     def map(self, fn):
         """Return a Scheme list after mapping Python function FN to SELF."""
-        mapped = fn(self.first)
-        if self.second is nil or isinstance(self.second, Pair):
-            return Pair(mapped, self.second.map(fn))
-        else:
+        items, rest = [], self
+        while isinstance(rest, Pair):
+            if type(rest) is ArrayList:
+                items.extend(fn(item) for item in rest.elements())
+                rest = rest.tail
+            else:
+                items.append(fn(rest.first))
+                rest = rest.second
+        if rest is not nil:
             raise TypeError("ill-formed list")
+        return _rebuild_list(items, nil)
 
 class nil:
     """The empty list"""
@@ -115,12 +138,152 @@ class nil:
     def map(self, fn):
         return self
 
+    def __reduce__(self):
+        return 'nil'
+
 nil = nil() # Assignment hides the nil class; there is only one instance
 
+def _rebuild_list(items, tail):
+    """Return the list of ITEMS ending in TAIL."""
+    result = tail
+    for item in reversed(items):
+        result = Pair(item, result)
+    return result
+
+class ArrayList(Pair):
+    """An immutable list whose elements are ITEMS[INDEX:], a tuple, followed
+    by TAIL.  It behaves as a chain of pairs, but takes one slot per element
+    and has constant-time len and indexing.
+
+    >>> s = freeze(read_line("(1 (2 3) . 4)"))
+    >>> print(s), s[1][0], print(s.second)
+    (1 (2 3) . 4)
+    ((2 3) . 4)
+    (None, 2, None)
+    >>> s == read_line("(1 (2 3) . 4)")
+    True
+    >>> s.first = 5
+    Traceback (most recent call last):
+        ...
+    TypeError: cannot modify a literal list
+    """
+    __slots__ = ('index',)
+
+    # The slots of Pair hold the items and the tail, since first and second
+    # are computed from them
+    items = Pair.first
+    tail = Pair.second
+
+    def __init__(self, items, index=0, tail=nil):
+        self.items = items
+        self.index = index
+        self.tail = tail
+
+    @property
+    def first(self):
+        return self.items[self.index]
+
+    @property
+    def second(self):
+        index = self.index + 1
+        if index == len(self.items):
+            return self.tail
+        return ArrayList(self.items, index, self.tail)
+
+    @first.setter
+    def first(self, value):
+        raise TypeError("cannot modify a literal list")
+
+    @second.setter
+    def second(self, value):
+        raise TypeError("cannot modify a literal list")
+
+    def __len__(self):
+        if self.tail is not nil:
+            raise TypeError("length attempted on improper list")
+        return len(self.items) - self.index
+
+    def __getitem__(self, k):
+        if k < 0:
+            raise IndexError("negative index into list")
+        if self.index + k < len(self.items):
+            return self.items[self.index + k]
+        return super().__getitem__(k)
+
+    def __iter__(self):
+        for i in range(self.index, len(self.items)):
+            yield self.items[i]
+        if self.tail is not nil:
+            raise TypeError("ill-formed list")
+
+    def elements(self):
+        """The elements of SELF before its tail, as a tuple."""
+        items = self.items
+        return items[self.index:] if self.index else items
+
+    def __reduce__(self):
+        return (ArrayList, (self.items, self.index, self.tail))
+
+def freeze(value):
+    """Return VALUE with each list in it replaced by an immutable ArrayList,
+    for literal data that is never modified."""
+    if not isinstance(value, Pair) or isinstance(value, ArrayList):
+        return value
+    items, rest = [], value
+    while isinstance(rest, Pair) and not isinstance(rest, ArrayList):
+        items.append(freeze(rest.first))
+        rest = rest.second
+    return ArrayList(tuple(items), 0, freeze(rest))
+
 # Scheme list parser
 
+# The parser keeps its own stack of partially read lists and pending quotes,
+# so its Python stack depth does not grow with the length or nesting of the
+# expression it reads.  When given a SourceSpans table, it records the source
+# span of each non-empty list it reads there.
+
+_QUOTES = {"'": Symbol("quote"), "#": Symbol("vector")}
+
+class SourceSpans:
+    """A side table of the source spans of lists, each a pair of positions
+    ((start line, column), (end line, column)) as in Buffer.position, from
+    the opening to the closing parenthesis.  Lists are looked up by
+    identity, so a table keeps the lists it records alive."""
+
+    def __init__(self):
+        self.spans = {}
 
-def scheme_read(src):
+    def record(self, expr, start, end):
+        self.spans[id(expr)] = (expr, start, end)
+
+    def get(self, expr):
+        """The span of the list EXPR, or None if it was not recorded."""
+        entry = self.spans.get(id(expr))
+        if entry is None or entry[0] is not expr:
+            return None
+        return entry[1:]
+
+    def __len__(self):
+        return len(self.spans)
+
+class _OpenList:
+    """A list whose elements are still being read."""
+
+    def __init__(self, start):
+        self.start = start
+        self.items = []
+        self.tail = nil
+        self.state = 'items'  # Then 'tail' after a dot, then 'close'
+
+    def close(self, end, spans):
+        result = self.tail
+        for item in reversed(self.items):
+            result = Pair(item, result)
+        if spans is not None and result is not self.tail:
+            spans.record(result, self.start, end)
+        return result
+
+def scheme_read(src, spans=None):
     """Read the next expression from SRC, a Buffer of tokens.
 
     >>> lines = ["(+ 1 ", "(+ 23 4)) ("]
@@ -131,24 +294,16 @@ def scheme_read(src):
     Pair('quote', Pair('hello', nil))
     >>> print(read_line("(car '(1 2))"))
     (car (quote (1 2)))
+    >>> spans = SourceSpans()
+    >>> expr = scheme_read(Buffer(TextTokenizer("(f 1\\n (g))")), spans)
+    >>> spans.get(expr), spans.get(expr[2])
+    (((1, 0), (2, 4)), ((2, 1), (2, 3)))
     """
     if src.current() is None:
         raise EOFError
-    val = src.pop()
-    if val == "nil":
-        return nil
-    elif val not in DELIMITERS:
-        return val
-    elif val == "'":
-        return Pair("quote", Pair(scheme_read(src), nil))
-    elif val == "#":
-        return Pair("vector", Pair(scheme_read(src), nil))
-    elif val == "(":
-        return read_tail(src)
-    else:
-        raise SyntaxError("unexpected token: {0}".format(val))
+    return _read(src, [], spans)
 
-def read_tail(src):
+def read_tail(src, spans=None):
     """Return the remainder of a list in SRC, starting before an element or ).
 
     >>> read_tail(Buffer(tokenize_lines([")"])))
@@ -171,28 +326,90 @@ def read_tail(src):
     Traceback (most recent call last):
         ...
     SyntaxError: Unexpected token: )
+    >>> len(read_line("(" + "1 " * 100000 + ")"))
+    100000
+    >>> read_line("(1 (2")
+    Traceback (most recent call last):
+        ...
+    SyntaxError: unexpected end of file in list starting at line 1
     """
-    try:
-        if src.current() is None:
-            raise SyntaxError("unexpected end of file")
-        elif src.current() == ")":
-            src.pop()
-            return nil
-        elif src.current() == ".":
-            src.pop()
-            if src.current() == ')':
-                raise SyntaxError('Unexpected token: )')
-            next_val = scheme_read(src)
-            if src.current() != ')':
-                raise SyntaxError('Expected one element after .')
-            src.pop()
-            return next_val
+    return _read(src, [_OpenList(_position(src, spans))], spans)
+
+def _read(src, stack, spans):
+    """Read the expression that completes the open lists and pending quotes
+    on STACK from SRC."""
+    while True:
+        top = stack[-1] if stack else None
+        if isinstance(top, _OpenList) and top.state != 'tail':
+            token = src.current()
+            if token is None and top.state != 'close':
+                _end_of_file(stack)
+            if top.state == 'close' or token == ')':
+                if token != ')':
+                    raise SyntaxError('Expected one element after .')
+                end = _position(src, spans)
+                src.pop()
+                stack.pop()
+                value = top.close(end, spans)
+            elif token == '.':
+                src.pop()
+                if src.current() == ')':
+                    raise SyntaxError('Unexpected token: )')
+                top.state = 'tail'
+                continue
+            else:
+                value = _read_token(src, stack, spans)
+        else:
+            value = _read_token(src, stack, spans)
+        if value is _MORE:
+            continue
+        # Deliver the value to the innermost pending quote or open list
+        while stack:
+            top = stack[-1]
+            if isinstance(top, _OpenList):
+                if top.state == 'tail':
+                    top.tail = value
+                    top.state = 'close'
+                else:
+                    top.items.append(value)
+                break
+            stack.pop()
+            value = Pair(top, Pair(value, nil))
         else:
-            first = scheme_read(src)
-            rest = read_tail(src)
-            return Pair(first, rest)
-    except EOFError:
-        raise SyntaxError("unexpected end of file")
+            return value
+
+_MORE = object() # Returned by _read_token after it opens a list or quote
+
+def _read_token(src, stack, spans):
+    """Read the next token of SRC as an atom, or push the list or quote it
+    opens onto STACK and return _MORE."""
+    if src.current() is None:
+        _end_of_file(stack)
+    start = _position(src, spans)
+    val = src.pop()
+    if val == "nil":
+        return nil
+    elif val not in DELIMITERS:
+        return val
+    elif val in _QUOTES:
+        stack.append(_QUOTES[val])
+    elif val == "(":
+        stack.append(_OpenList(start))
+    else:
+        raise SyntaxError("unexpected token: {0}".format(val))
+    return _MORE
+
+def _position(src, spans):
+    """The position of the current token of SRC, or only its line if the
+    positions of lists are not recorded in SPANS."""
+    return (src.line_number, None) if spans is None else src.position
+
+def _end_of_file(stack):
+    lists = [item for item in stack if isinstance(item, _OpenList)]
+    if not lists:
+        raise EOFError
+    raise SyntaxError("unexpected end of file in list starting at line "
+                      "{0}".format(lists[-1].start[0]))
 
 # Convenience methods
 
@@ -208,6 +425,11 @@ def buffer_lines(lines, prompt="scm> ", show_prompt=False):
         input_lines = LineReader(lines, prompt)
     return Buffer(tokenize_lines(input_lines))
 
+def buffer_text(text):
+    """Return a Buffer instance of the tokens in TEXT, the contents of a
+    whole source file, without echoing them."""
+    return Buffer(TextTokenizer(text))
+
 def read_line(line):
     """Read a single string LINE as a Scheme expression."""
     return scheme_read(Buffer(tokenize_lines([line])))
@@ -0,0 +1,189 @@
+"""This module implements record types, defined with define-record-type as in
+SRFI 9:
+
+    (define-record-type point (make-point x y) point?
+      (x point-x set-point-x!)
+      (y point-y))
+
+Each record type is a Python class whose instances store their fields in
+__slots__ named by field position.  Its accessors and modifiers are
+primitives that check their arguments and then call the slot descriptors
+directly, so a field access is a type test and a single attribute load.
+
+A record type is pickled by a uid given to it when it is defined, so records
+restored from an image or returned by a parallel worker belong to the type
+of that uid already in the process, if there is one.
+"""
+
+import uuid
+import weakref
+from scheme import *
+
+# The record types of this process, by uid, so that records unpickled from
+# an image or a worker belong to the same type as those made here
+_record_types = weakref.WeakValueDictionary()
+
+class Record:
+    """A record, an instance of the class of its RECORD_TYPE."""
+    __slots__ = ()
+
+    def __str__(self):
+        rtype = self.record_type
+        values = [str(getattr(self, slot)) for slot in rtype.slots]
+        return "#[{0}]".format(" ".join([rtype.name] + values))
+
+    def __reduce__(self):
+        rtype = self.record_type
+        return (_rebuild_record, (rtype, [getattr(self, slot)
+                                          for slot in rtype.slots]))
+
+def _rebuild_record(rtype, values):
+    record = object.__new__(rtype.cls)
+    for slot, value in zip(rtype.slots, values):
+        setattr(record, slot, value)
+    return record
+
+def _rebuild_record_type(uid, name, fields):
+    rtype = _record_types.get(uid)
+    if rtype is None:
+        rtype = RecordType(name, fields, uid)
+    return rtype
+
+class RecordType:
+    """A record type NAME with the field names FIELDS, a tuple of symbols,
+    identified across processes by UID, a new one if it is None."""
+
+    def __init__(self, name, fields, uid=None):
+        self.name = name
+        self.fields = fields
+        self.uid = uid or uuid.uuid4().hex
+        _record_types[self.uid] = self
+        self.slots = tuple('f{0}'.format(i) for i in range(len(fields)))
+        self.cls = type(str(name), (Record,),
+                        {'__slots__': self.slots, 'record_type': self})
+
+    def __str__(self):
+        return "#[record-type {0}]".format(self.name)
+
+    def __reduce__(self):
+        return (_rebuild_record_type, (self.uid, self.name, self.fields))
+
+    def descriptor(self, field):
+        """Return the slot descriptor of the symbol FIELD."""
+        if field not in self.fields:
+            raise SchemeError("{0} is not a field of {1}".format(field,
+                                                                 self.name))
+        return self.cls.__dict__[self.slots[self.fields.index(field)]]
+
+    def function(self, kind, arg, proc_name):
+        """Return the Python function of the record procedure PROC_NAME of
+        this type: a constructor taking the fields ARG, a predicate, or the
+        accessor or modifier of the field ARG."""
+        cls = self.cls
+        if kind == 'predicate':
+            return lambda x: type(x) is cls
+        if kind in ('accessor', 'modifier'):
+            return self.field_function(kind, arg, proc_name)
+        setters = [self.descriptor(field).__set__ for field in arg]
+        unset = [self.cls.__dict__[slot].__set__ for field, slot
+                 in zip(self.fields, self.slots) if field not in arg]
+        name = self.name
+        def construct(*values):
+            if len(values) != len(setters):
+                raise SchemeError("{0} needs {1} field values".format(
+                    name, len(setters)))
+            record = object.__new__(cls)
+            for setter, value in zip(setters, values):
+                setter(record, value)
+            for setter in unset:
+                setter(record, False)
+            return record
+        return construct
+
+    def field_function(self, kind, field, proc_name):
+        """Return the accessor or modifier (KIND) of FIELD, which checks that
+        it is given a record of this type, and a value for a modifier."""
+        cls, count = self.cls, 1 if kind == 'accessor' else 2
+        descriptor = self.descriptor(field)
+        if kind == 'accessor':
+            method = descriptor.__get__
+        else:
+            method = descriptor.__set__
+        def check(args):
+            if len(args) != count:
+                raise SchemeError("{0} needs {1} argument{2}".format(
+                    proc_name, count, 's' if count > 1 else ''))
+            raise SchemeError("argument 0 of {0} is not a {1}".format(
+                proc_name, self.name))
+        def field_procedure(*args):
+            if len(args) != count or type(args[0]) is not cls:
+                check(args)
+            return method(*args)
+        return field_procedure
+
+class RecordProcedure(PrimitiveProcedure):
+    """A constructor, predicate, accessor or modifier (KIND) of the record
+    type RTYPE called NAME, whose field or fields are ARG."""
+
+    def __init__(self, rtype, kind, arg=None, name=None):
+        PrimitiveProcedure.__init__(self, rtype.function(kind, arg, name))
+        self.rtype, self.kind, self.arg, self.name = rtype, kind, arg, name
+
+    def __str__(self):
+        return "#[{0} {1}]".format(self.kind, self.rtype.name)
+
+    def __reduce__(self):
+        return (RecordProcedure, (self.rtype, self.kind, self.arg, self.name))
+
+def do_define_record_type_form(vals, env):
+    """Evaluate a define-record-type form with parameters VALS in environment
+    ENV, defining the record type, its constructor, predicate, accessors and
+    modifiers.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line("(define-record-type point (make-point x y) "
+    ...     "point? (x point-x set-point-x!) (y point-y))"), env)
+    >>> _ = scheme_eval(read_line("(define p (make-point 1 2))"), env)
+    >>> _ = scheme_eval(read_line("(set-point-x! p 3)"), env)
+    >>> print(scheme_eval(read_line("(list (point? p) (point-x p) p)"), env))
+    (True 3 #[point 3 2])
+    >>> scheme_eval(read_line("(point-y 5)"), env)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: argument 0 of point-y is not a point
+    >>> scheme_eval(read_line("(point-x p 5)"), env)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: point-x needs 1 argument
+    >>> scheme_eval(read_line("(set-point-x! p)"), env)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: set-point-x! needs 2 arguments
+    """
+    check_form(vals, 3)
+    name, constructor = vals.first, vals.second.first
+    predicate, specs = vals.second.second.first, vals.second.second.second
+    check_type(name, scheme_symbolp, 0, "define-record-type")
+    check_type(predicate, scheme_symbolp, 2, "define-record-type")
+    fields = []
+    for spec in specs:
+        check_form(spec, 1, 3)
+        fields.append(check_type(spec.first, scheme_symbolp, 3,
+                                 "define-record-type"))
+    check_formals(scheme_list(*fields))
+    rtype = RecordType(name, tuple(fields))
+    env.define(name, rtype)
+    if constructor is not False:
+        check_form(constructor, 1)
+        check_formals(constructor.second)
+        env.define(constructor.first,
+                   RecordProcedure(rtype, 'constructor',
+                                   tuple(constructor.second),
+                                   constructor.first))
+    env.define(predicate, RecordProcedure(rtype, 'predicate', None, predicate))
+    for spec in specs:
+        for kind, proc_name in zip(('accessor', 'modifier'), spec.second):
+            check_type(proc_name, scheme_symbolp, 3, "define-record-type")
+            env.define(proc_name, RecordProcedure(rtype, kind, spec.first,
+                                                  proc_name))
+    return name
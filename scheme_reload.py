@@ -0,0 +1,195 @@
+"""This module reloads Scheme source files into a running interpreter,
+evaluating again only what changed since the last time.
+
+(reload "contest.scm") reads the file and compares its top-level forms with
+those evaluated by the previous reload of it in the same global frame.  A
+define form is evaluated again if it is new or changed, or if it defines a
+value (not a procedure) computed from names that depend on a changed
+definition.  Procedures look up the names they use when they are called, so
+they need not be defined again, but memoized procedures that depend on a
+changed definition have their caches cleared.  Other forms are evaluated
+only if they are new or changed.  Parallel operations send the workers the
+global bindings they begin with, so they see what was reloaded.  The first
+reload of a file evaluates all of it, and definitions removed from a file
+stay bound.
+"""
+
+import os
+import weakref
+from scheme import *
+
+class SourceRecord:
+    """The forms of a source file last evaluated by reload: DEFINES maps
+    each defined name and the number of earlier define forms of it in the
+    file to its define form, and OTHERS lists the other forms."""
+
+    def __init__(self):
+        self.defines = {}
+        self.others = []
+
+# The SourceRecords of each global frame, by absolute file name
+_records = weakref.WeakKeyDictionary()
+
+def symbols(expr):
+    """Return the set of symbols that occur anywhere in EXPR.
+
+    >>> sorted(symbols(read_line("(define (f x) (g x '(h . 2)))")))
+    ['define', 'f', 'g', 'h', 'quote', 'x']
+    """
+    found, pending = set(), [expr]
+    while pending:
+        expr = pending.pop()
+        if type(expr) is Symbol:
+            found.add(expr)
+        elif isinstance(expr, Pair):
+            while isinstance(expr, Pair):
+                pending.append(expr.first)
+                expr = expr.second
+            pending.append(expr)
+        elif isinstance(expr, list):
+            pending.extend(expr)
+    return found
+
+def _define_name(expr):
+    """The name defined by EXPR, a define or define-memoized form, or None."""
+    if isinstance(expr, Pair) and expr.first in ('define', 'define-memoized'):
+        return defined_name(expr)
+    return None
+
+def _define_keys(forms):
+    """Return a list of the key in SourceRecord.defines of each of FORMS, or
+    None for forms that are not define forms.
+
+    >>> forms = ["(define a 1)", "(f)", "(define a 2)"]
+    >>> _define_keys([read_line(form) for form in forms])
+    [('a', 0), None, ('a', 1)]
+    """
+    keys, counts = [], {}
+    for expr in forms:
+        name = _define_name(expr)
+        if name is None:
+            keys.append(None)
+        else:
+            keys.append((name, counts.get(name, 0)))
+            counts[name] = keys[-1][1] + 1
+    return keys
+
+def _defines_procedure(expr):
+    """Whether the define form EXPR binds a procedure, which looks up the
+    names it mentions only when it is called."""
+    target = expr.second.first
+    if expr.first == 'define-memoized' or isinstance(target, Pair):
+        return True
+    value = expr.second.second
+    return (isinstance(value, Pair) and isinstance(value.first, Pair) and
+            value.first.first in ('lambda', 'mu'))
+
+def _changed_names(forms, record):
+    """Return the set of names whose define forms in FORMS differ from those
+    in RECORD, and the set of those names and the names whose definitions
+    depend on them."""
+    changed, uses = set(), {}
+    for expr, key in zip(forms, _define_keys(forms)):
+        if key is None:
+            continue
+        name = key[0]
+        if key not in record.defines or record.defines[key] != expr:
+            changed.add(name)
+        else:
+            uses.setdefault(name, set()).update(symbols(expr.second.second))
+    affected = set(changed)
+    while True:
+        more = [name for name, refs in uses.items() if refs & affected]
+        if not more:
+            return changed, affected
+        for name in more:
+            affected.add(name)
+            del uses[name]
+
+def _clear_memo_caches(env, names):
+    """Clear the cache of each memoized procedure in the global frame ENV
+    whose body mentions one of NAMES."""
+    for value in list(env.bindings.values()):
+        if isinstance(value, MemoizedProcedure):
+            body = getattr(value.procedure, 'body', nil)
+            if symbols(body) & names:
+                value.cache.clear()
+
+def reload_file(filename, env, definitions_only=False):
+    """Evaluate the forms of the Scheme source file FILENAME in the global
+    frame of ENV that changed since its last reload, or only its define
+    forms if DEFINITIONS_ONLY, and return the names that were redefined.
+
+    >>> import tempfile
+    >>> env = create_global_frame()
+    >>> path = os.path.join(tempfile.mkdtemp(), 'colors.scm')
+    >>> def write(src):
+    ...     with open(path, 'w') as outfile:
+    ...         _ = outfile.write(src)
+    ...     os.utime(path, (0, os.stat(path).st_mtime + 1))
+    >>> write("(define k 2) (define (f x) (* k x)) (define t (f 3))"
+    ...       "(define-memoized (g x) (f x)) (display (g 1))")
+    >>> reload_file(path, env)
+    2['k', 'f', 't', 'g']
+    >>> write("(define k 10) (define (f x) (* k x)) (define t (f 3))"
+    ...       "(define-memoized (g x) (f x)) (display (g 1))")
+    >>> reload_file(path, env), env.lookup('t')
+    (['k', 't'], 30)
+    >>> scheme_eval(read_line("(g 1)"), env)
+    10
+    >>> reload_file(path, env)
+    []
+    >>> write("(define k 1) (define k (+ k 1))")
+    >>> reload_file(path, env), reload_file(path, env), env.lookup('k')
+    (['k', 'k'], [], 2)
+    >>> write('(display "a") (display "b")')
+    >>> reload_file(path, env)
+    ab[]
+    >>> write('(display "a") (car 1) (display "b")')
+    >>> reload_file(path, env)
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: argument 0 of car has wrong type (int)
+    >>> write('(display "a") (display "c") (display "b")')
+    >>> reload_file(path, env)
+    c[]
+    """
+    env = env.global_frame()
+    with scheme_open(filename) as infile:
+        path = os.path.abspath(infile.name)
+    forms = read_file(path)
+    records = _records.setdefault(env, {})
+    record = records.setdefault(path, SourceRecord())
+    changed, affected = _changed_names(forms, record)
+    old_others, others, redefined = list(record.others), [], []
+    loaded = False
+    try:
+        for expr, key in zip(forms, _define_keys(forms)):
+            if key is not None:
+                name = key[0]
+                if name in changed or (name in affected and
+                                       not _defines_procedure(expr)):
+                    scheme_eval(expr, env)
+                    redefined.append(name)
+                record.defines[key] = expr
+            elif not definitions_only:
+                if expr in old_others:
+                    old_others.remove(expr)
+                else:
+                    scheme_eval(expr, env)
+                others.append(expr)
+        loaded = True
+    finally:
+        if not definitions_only:
+            # After an error, keep the forms evaluated before that were not
+            # reached, so that they are not evaluated again
+            record.others = others if loaded else others + old_others
+        _clear_memo_caches(env, affected)
+    return redefined
+
+@primitive("reload", use_env=True)
+def scheme_reload(filename, env):
+    """Evaluate what changed in the Scheme source file FILENAME since it was
+    last reloaded, and return a list of the names that were redefined."""
+    filename = check_filename(filename, 0, "reload")
+    return scheme_list(*reload_file(filename, env))
@@ -0,0 +1,471 @@
+"""This module implements a batch render driver for Scheme image programs.
+
+A program like contest.scm defines a color procedure of screen coordinates
+(point-color) along with the globals it reads (width, height, center and
+zoom), and then draws every pixel with the turtle.  The driver instead loads
+only the program's definitions, evaluates the color procedure itself for each
+pixel, and streams the results to PPM or PNG files a scanline at a time.
+
+Usage: python3 scheme_render.py contest.scm -frames 100 -zoom-factor 0.5
+
+Past a zoom of about 1e-13, -deep replaces point-color with the perturbation
+sampler of scheme_deepzoom, which still colors pixels with colorize.
+
+When rendering a zoom animation, each frame reuses the previous frame's
+samples: a pixel whose point in the complex plane was already computed at the
+previous scale (within TOLERANCE pixels) is resampled from that frame, and
+only the new detail is computed.
+
+Single frames journal their completed rows to a checkpoint file next to the
+output, so an interrupted render continues where it stopped with -resume.
+Scheme programs run by scheme.py render the same way with render-image.
+
+With -antialias N, each frame is refined adaptively: only pixels that stand
+out from their neighbors, or lie close to the set boundary, get N by N extra
+jittered samples.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+from decimal import Decimal
+from scheme import *
+from scheme_checkpoint import Checkpoint, source_hash
+from scheme_deepzoom import DeepZoomSampler
+from scheme_image import open_sink, scheme_rgb
+from ucb import main
+
+class Viewport:
+    """The mapping from pixel coordinates to points in the plane used by a
+    program's color procedure.  This mirrors normalize-screencoords in
+    contest.scm: the height spans 2 * ZOOM around CENTER, and y grows
+    downwards on screen.  CENTER may hold Decimals for deep zooms, so points
+    are usually handled as double-precision offsets from CENTER.
+
+    >>> view = Viewport(4, 2, (-0.5, 0.5), 0.5)
+    >>> view.point(0, 0)
+    (-1.5, 1.0)
+    >>> view.pixel(*view.offset(3, 1))
+    (3.0, 1.0)
+    """
+
+    def __init__(self, width, height, center, zoom):
+        self.width = width
+        self.height = height
+        self.center = center
+        self.zoom = zoom
+
+    def offset(self, x, y):
+        """The offset from CENTER of the point sampled at pixel (X, Y)."""
+        nx = (2 * x / self.width - 1) * (self.width / self.height)
+        ny = 1 - 2 * y / self.height
+        return nx * self.zoom, ny * self.zoom
+
+    def point(self, x, y):
+        """The point in the plane sampled at pixel (X, Y)."""
+        dx, dy = self.offset(x, y)
+        return float(self.center[0]) + dx, float(self.center[1]) + dy
+
+    def pixel(self, dx, dy):
+        """The (fractional) pixel coordinates at offset (DX, DY) from
+        CENTER."""
+        nx, ny = dx / self.zoom, dy / self.zoom
+        return ((nx * self.height / self.width + 1) * self.width / 2,
+                (1 - ny) * self.height / 2)
+
+    def bind(self, env):
+        """Define the globals read by the color procedure in ENV."""
+        env.define("width", self.width)
+        env.define("height", self.height)
+        env.define("center", Vector(float(c) for c in self.center))
+        env.define("zoom", self.zoom)
+
+class ProcedureSampler:
+    """Samples pixels by applying a Scheme color procedure of pixel
+    coordinates, such as point-color, in the environment ENV.  Coordinates
+    may be fractional, as for antialiasing."""
+
+    def __init__(self, procedure, env):
+        self.procedure = procedure
+        self.env = env
+
+    def begin_frame(self, view):
+        view.bind(self.env)
+
+    def sample(self, x, y):
+        """Return the Scheme color at pixel (X, Y) and its distance estimate
+        to the set boundary, which is unknown (None) for a color procedure."""
+        color = scheme_apply(self.procedure, Pair(x, Pair(y, nil)), self.env)
+        return color, None
+
+    def summary(self):
+        return ""
+
+DEFAULT_TOLERANCE = 1e-6
+
+class FrameImage:
+    """The pixels of one rendered frame, as rows of rgb bytes, along with the
+    Viewport they sample.  Each pixel also records its distance estimate (or
+    None) and whether it has been refined by antialiasing."""
+
+    def __init__(self, view):
+        self.view = view
+        self.rows = [bytearray(3 * view.width) for _ in range(view.height)]
+        self.distances = [[None] * view.width for _ in range(view.height)]
+        self.refined = [bytearray(view.width) for _ in range(view.height)]
+
+    def get(self, x, y):
+        return self.rows[y][3*x:3*x+3]
+
+    def put(self, x, y, rgb):
+        self.rows[y][3*x:3*x+3] = bytes(rgb)
+
+    def locate(self, dx, dy, tolerance=DEFAULT_TOLERANCE):
+        """Return the coordinates of the pixel of SELF sampled at offset
+        (DX, DY) from the center, or None if no pixel lies within TOLERANCE
+        pixels of it."""
+        x, y = self.view.pixel(dx, dy)
+        ix, iy = round(x), round(y)
+        if (abs(x - ix) > tolerance or abs(y - iy) > tolerance or
+            not (0 <= ix < self.view.width and 0 <= iy < self.view.height)):
+            return None
+        return ix, iy
+
+def render_frame(sampler, view, previous=None, tolerance=DEFAULT_TOLERANCE):
+    """Render VIEW by sampling each pixel's coordinates with SAMPLER.  Pixels
+    already sampled by the PREVIOUS FrameImage, which shares the center of
+    VIEW, are copied from it instead.  Copied pixels are not marked refined,
+    since VIEW may be at a finer scale than the pixels they were refined at.
+    Returns the FrameImage and the number of reused pixels."""
+    sampler.begin_frame(view)
+    image = FrameImage(view)
+    reused = 0
+    for y in range(view.height):
+        for x in range(view.width):
+            found = None
+            if previous is not None:
+                found = previous.locate(*view.offset(x, y), tolerance=tolerance)
+            if found is None:
+                color, distance = sampler.sample(x, y)
+                image.put(x, y, scheme_rgb(color))
+                image.distances[y][x] = distance
+            else:
+                px, py = found
+                image.put(x, y, previous.get(px, py))
+                image.distances[y][x] = previous.distances[py][px]
+                reused += 1
+    return image, reused
+
+class Antialias:
+    """An adaptive supersampling stage.  After one sample per pixel, only
+    pixels whose color differs from a neighbor's by more than CONTRAST (a
+    fraction of the full range) in some channel, or whose distance estimate
+    is within DISTANCE pixels of the set boundary, are resampled with a GRID
+    by GRID pattern of jittered samples.  SEED makes the jitter repeatable.
+    Only samplers that estimate distances, such as -deep, support the
+    distance criterion; a Scheme color procedure gives none."""
+
+    def __init__(self, grid=4, contrast=0.1, distance=1.0, seed=0):
+        self.grid = grid
+        self.contrast = contrast
+        self.distance = distance
+        self.random = random.Random(seed)
+
+    def flag_row(self, view, rows, distances, refined, y):
+        """Return the x coordinates of the pixels in row Y to refine.  ROWS
+        maps row numbers to the one-sample rgb bytes of rows Y-1 through Y+1,
+        DISTANCES holds the distance estimates of row Y, and pixels marked in
+        REFINED (if not None) are skipped."""
+        limit = self.contrast * 255
+        near = self.distance * 2 * view.zoom / view.height
+        row = rows[y]
+        result = []
+        for x in range(view.width):
+            if refined is not None and refined[x]:
+                continue
+            distance = distances[x]
+            if distance is not None and distance < near:
+                result.append(x)
+                continue
+            rgb = row[3*x:3*x+3]
+            for nx, ny in ((x-1, y), (x+1, y), (x, y-1), (x, y+1)):
+                if 0 <= nx < view.width and 0 <= ny < view.height:
+                    other = rows[ny][3*nx:3*nx+3]
+                    if max(abs(a - b) for a, b in zip(rgb, other)) > limit:
+                        result.append(x)
+                        break
+        return result
+
+    def refine(self, sampler, x, y):
+        """Return the average rgb of GRID by GRID jittered samples of SAMPLER
+        within pixel (X, Y)."""
+        n = self.grid
+        total = [0, 0, 0]
+        for i in range(n):
+            for j in range(n):
+                sx = x - 0.5 + (i + self.random.random()) / n
+                sy = y - 0.5 + (j + self.random.random()) / n
+                rgb = scheme_rgb(sampler.sample(sx, sy)[0])
+                for c in range(3):
+                    total[c] += rgb[c]
+        return [round(t / (n * n)) for t in total]
+
+    def __call__(self, sampler, image):
+        """Refine the flagged pixels of the FrameImage IMAGE with SAMPLER,
+        returning how many were refined."""
+        view = image.view
+        flagged = [(x, y) for y in range(view.height)
+                   for x in self.flag_row(view, image.rows, image.distances[y],
+                                          image.refined[y], y)]
+        for x, y in flagged:
+            image.put(x, y, self.refine(sampler, x, y))
+            image.refined[y][x] = 1
+        return len(flagged)
+
+    def report(self, total, computed, refined):
+        """Describe refining REFINED of TOTAL pixels, after computing
+        COMPUTED of them with one sample."""
+        full = self.grid ** 2
+        cost = (computed + refined * full) / (total * full)
+        return (", antialiased {0} pixels ({1:.1%} of full supersampling cost)"
+                .format(refined, cost))
+
+def frame_filename(output, k, frames=1):
+    """The filename of frame K of FRAMES given the OUTPUT pattern, which may
+    include a %-format for the frame number.  Without one, the frames of an
+    animation are numbered before the extension.
+
+    >>> frame_filename('zoom%03d.png', 7, 10)
+    'zoom007.png'
+    >>> frame_filename('zoom.png', 0), frame_filename('zoom.png', 7, 10)
+    ('zoom.png', 'zoom0007.png')
+    """
+    if '%' in output:
+        return output % k
+    if frames == 1:
+        return output
+    base, ext = os.path.splitext(output)
+    return '{0}{1:04d}{2}'.format(base, k, ext)
+
+def render_scanlines(sampler, view, sink, antialias=None, start=0,
+                     checkpoint=None):
+    """Render VIEW into the image SINK one scanline at a time from row START,
+    refining each with the ANTIALIAS stage if given and journaling it to
+    CHECKPOINT if given.  Only the one-sample rows needed to antialias the
+    current row are kept.  Returns the number of refined pixels."""
+    sampler.begin_frame(view)
+    rows, distances = {}, {}
+    refined = 0
+    for y in range(max(start - 1, 0), view.height + 1):
+        if y < view.height:
+            rows[y] = bytearray(3 * view.width)
+            distances[y] = [None] * view.width
+            for x in range(view.width):
+                color, distances[y][x] = sampler.sample(x, y)
+                rows[y][3*x:3*x+3] = bytes(scheme_rgb(color))
+        done = y - 1  # Every neighbor of row done is now sampled
+        if done < start:
+            continue
+        row = bytearray(rows[done])
+        if antialias is not None:
+            for x in antialias.flag_row(view, rows, distances[done], None,
+                                        done):
+                row[3*x:3*x+3] = bytes(antialias.refine(sampler, x, done))
+                refined += 1
+        sink.write_row(row)
+        if checkpoint is not None:
+            checkpoint.record(done, row)
+        rows.pop(done - 1, None)
+        distances.pop(done - 1, None)
+    return refined
+
+def render_image(sampler, view, filename, antialias=None, checkpoint=None,
+                 resume=False):
+    """Render a single frame VIEW, streaming it to FILENAME (a PPM or PNG
+    file) as scanlines are completed.  Completed rows are journaled to
+    CHECKPOINT if given, and if RESUME, rows from a previous run's matching
+    journal are reused.  A partial image left by an earlier run is removed
+    once the frame is complete."""
+    with open_sink(filename, view.width, view.height) as sink:
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.restore(sink, resume)
+            if start:
+                print("resuming {0} at row {1}".format(filename, start))
+        refined = render_scanlines(sampler, view, sink, antialias, start,
+                                   checkpoint)
+    if os.path.exists(filename + '.partial'):
+        os.remove(filename + '.partial')
+    if checkpoint is not None:
+        checkpoint.finish()
+    report = ""
+    if antialias is not None:
+        total = view.width * view.height
+        report = antialias.report(total, total, refined)
+    print("{0} (zoom {1:g}){2}{3}".format(filename, view.zoom,
+                                          sampler.summary(), report))
+
+def render_animation(sampler, view, frames, zoom_factor, output,
+                     tolerance=DEFAULT_TOLERANCE, antialias=None):
+    """Render FRAMES frames starting at VIEW, multiplying the zoom by
+    ZOOM_FACTOR after each one, and refining each with the ANTIALIAS stage if
+    given.  Frame k is written to frame_filename(OUTPUT, k, FRAMES), a PPM or
+    PNG file."""
+    previous = None
+    for k in range(frames):
+        image, reused = render_frame(sampler, view, previous, tolerance)
+        total = view.width * view.height
+        report = ""
+        if antialias is not None:
+            refined = antialias(sampler, image)
+            report = antialias.report(total, total - reused, refined)
+        filename = frame_filename(output, k, frames)
+        with open_sink(filename, view.width, view.height) as sink:
+            for row in image.rows:
+                sink.write_row(row)
+        print("frame {0}: {1} (zoom {2:g}), reused {3}/{4} pixels ({5:.1%}){6}"
+              "{7}".format(k, filename, view.zoom, reused, total,
+                           reused / total, sampler.summary(), report))
+        sys.stdout.flush()
+        previous = image
+        view = Viewport(view.width, view.height, view.center,
+                        view.zoom * zoom_factor)
+
+class RenderOptions:
+    """Settings for renders started by a Scheme program, given on the command
+    line of scheme.py.  OUTPUT is the image file to render to, if any, and
+    SOURCES are the program files hashed into checkpoints."""
+
+    def __init__(self):
+        self.output = None
+        self.resume = False
+        self.checkpoint_interval = 16
+        self.sources = []
+
+options = RenderOptions()
+
+def render_checkpoint(filename, view, sources, interval, **params):
+    """Return the Checkpoint journaling a render of VIEW to FILENAME, whose
+    parameters include the hash of the files SOURCES and PARAMS."""
+    params.update(output=filename, width=view.width, height=view.height,
+                  zoom=repr(view.zoom), center=[str(c) for c in view.center],
+                  source=source_hash(sources))
+    return Checkpoint(filename + '.ckpt', params, interval)
+
+def procedure_key(procedure, env):
+    """Return the name of a binding of PROCEDURE in the global frame ENV, or
+    else a hash of its text, to identify it in checkpoints.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line("(define (f x y) (+ x y))"), env)
+    >>> procedure_key(env.lookup('f'), env)
+    'f'
+    >>> len(procedure_key(scheme_eval(read_line("(lambda (x) x)"), env), env))
+    16
+    """
+    for name, value in env.bindings.items():
+        if value is procedure:
+            return str(name)
+    return hashlib.sha256(str(procedure).encode()).hexdigest()[:16]
+
+@primitive("render-image", use_env=True)
+def scheme_render_image(procedure, width, height, filename, env):
+    """Render the color procedure PROCEDURE of pixel coordinates to the image
+    file FILENAME, using the globals center and zoom, and journaling progress
+    so that scheme.py --resume can continue an interrupted render."""
+    check_type(width, scheme_integerp, 1, "render-image")
+    check_type(height, scheme_integerp, 2, "render-image")
+    filename = check_filename(filename, 3, "render-image")
+    env = env.global_frame()
+    center = env.lookup("center")
+    view = Viewport(width, height, (center[0], center[1]), env.lookup("zoom"))
+    checkpoint = render_checkpoint(filename, view, options.sources,
+                                   options.checkpoint_interval,
+                                   procedure=procedure_key(procedure, env))
+    render_image(ProcedureSampler(procedure, env), view, filename,
+                 checkpoint=checkpoint, resume=options.resume)
+    return okay
+
+@primitive("render-output")
+def scheme_render_output():
+    """The image file given by scheme.py -output, or false if none was."""
+    if options.output is None:
+        return False
+    return SchemeString(options.output)
+
+@main
+def run(*argv):
+    parser = argparse.ArgumentParser(prog="scheme_render.py",
+                                     description="Render a Scheme image "
+                                     "program to PNG or PPM files.")
+    parser.add_argument("file", help="program defining the color procedure")
+    parser.add_argument("-load", nargs="*", default=[], metavar="FILE",
+                        help="library files to load before the program")
+    parser.add_argument("-procedure", default="point-color",
+                        help="color procedure of pixel coordinates x and y")
+    parser.add_argument("-output", default="frame%04d.png",
+                        help="output .png or .ppm file, with a %%-format for "
+                        "the frame number")
+    parser.add_argument("-frames", type=int, default=1)
+    parser.add_argument("-zoom-factor", type=float, default=0.5,
+                        help="zoom multiplier from one frame to the next")
+    parser.add_argument("-tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="distance in pixels at which a previous frame's "
+                        "sample is reused")
+    parser.add_argument("-antialias", type=int, default=0, metavar="N",
+                        help="refine high-contrast or boundary pixels with "
+                        "N by N jittered samples")
+    parser.add_argument("-aa-contrast", type=float, default=0.1,
+                        help="channel difference from a neighbor (0 - 1) "
+                        "that flags a pixel for antialiasing")
+    parser.add_argument("-aa-distance", type=float, default=1.0,
+                        help="distance estimate in pixels below which -deep "
+                        "flags a pixel for antialiasing")
+    parser.add_argument("-resume", action="store_true",
+                        help="continue a single-frame render from its "
+                        "checkpoint")
+    parser.add_argument("-checkpoint-interval", type=int, default=16,
+                        metavar="ROWS", help="rows between checkpoint syncs")
+    parser.add_argument("-width", type=int)
+    parser.add_argument("-height", type=int)
+    parser.add_argument("-zoom", type=float)
+    parser.add_argument("-center", type=Decimal, nargs=2, metavar=("X", "Y"))
+    parser.add_argument("-deep", action="store_true",
+                        help="use perturbation theory for zooms beyond double "
+                        "precision, coloring pixels with -colorize")
+    parser.add_argument("-colorize", default="colorize",
+                        help="coloring procedure used by -deep")
+    args = parser.parse_args(argv)
+
+    env = create_global_frame()
+    for filename in args.load:
+        scheme_load(filename, True, env)
+    load_definitions(args.file, env)
+
+    def param(name, value):
+        return env.lookup(name) if value is None else value
+    view = Viewport(param("width", args.width), param("height", args.height),
+                    tuple(param("center", args.center)),
+                    param("zoom", args.zoom))
+    if args.deep:
+        sampler = DeepZoomSampler(env.lookup(args.colorize), env)
+    else:
+        sampler = ProcedureSampler(env.lookup(args.procedure), env)
+    antialias = None
+    if args.antialias > 1:
+        antialias = Antialias(args.antialias, args.aa_contrast,
+                              args.aa_distance)
+    if args.frames == 1:
+        filename = frame_filename(args.output, 0)
+        checkpoint = render_checkpoint(filename, view, [args.file] + args.load,
+                                       args.checkpoint_interval,
+                                       procedure=args.procedure,
+                                       deep=args.deep,
+                                       antialias=args.antialias)
+        render_image(sampler, view, filename, antialias, checkpoint,
+                     args.resume)
+    else:
+        render_animation(sampler, view, args.frames, args.zoom_factor,
+                         args.output, args.tolerance, antialias)
@@ -0,0 +1,223 @@
+"""This module saves a fully initialized global environment to an image file
+and restores it, so that an interpreter can start with its libraries already
+loaded instead of evaluating them again, like a Lisp heap dump.
+
+The image holds the bindings of the global frame, pickled in one piece so that
+shared structure survives.  Primitive procedures are stored by name and the
+global frame by reference, and both are resolved against a fresh global frame
+when the image is restored.  Restoring an image creates only the classes of
+Scheme values, so an image cannot run other code when it is loaded.
+"""
+
+import io
+import pickle
+from scheme import *
+
+IMAGE_MAGIC = b'SCMI'
+IMAGE_VERSION = 1
+
+# Classes of the interpreter, which are pickled by name and state
+_CLASSES = {cls.__name__: cls for cls in (Frame, LambdaProcedure, MuProcedure,
+                                          MemoizedProcedure, Promise)}
+
+def _new_instance(name):
+    """Return an empty instance of the interpreter class called NAME, whose
+    attributes are restored afterward."""
+    return object.__new__(_CLASSES[name])
+
+def _reduce_instance(obj):
+    return (_new_instance, (type(obj).__name__,), obj.__dict__)
+
+def _reduce_pair(pair):
+    """Pickle a list or stream as its elements, the forced promises between
+    them, and its tail, so that long ones do not exhaust the stack.  A cyclic
+    one is pickled pair by pair instead."""
+    items, links, rest, seen = [], [], pair, set()
+    while type(rest) is Pair:
+        if id(rest) in seen:
+            return (Pair, (None, None),
+                    (None, {'first': pair.first, 'second': pair.second}))
+        seen.add(id(rest))
+        items.append(rest.first)
+        rest = rest.second
+        forced = isinstance(rest, Promise) and rest.forced
+        links.append(forced)
+        if forced:
+            rest = rest.value
+    return (_rebuild_stream, (items, links, rest))
+
+def _rebuild_stream(items, links, tail):
+    """Return the list or stream of ITEMS ending in TAIL, with a forced
+    promise after each item whose entry in LINKS is true."""
+    result = tail
+    for item, forced in zip(reversed(items), reversed(links)):
+        if forced:
+            promise = Promise(None, None)
+            promise.value, promise.forced = result, True
+            result = promise
+        result = Pair(item, result)
+    return result
+
+def _primitive_names(env):
+    """Return a dict from the (function, use_env) of each primitive procedure
+    bound in ENV to its name."""
+    names = {}
+    for name, value in sorted(env.bindings.items()):
+        if isinstance(value, PrimitiveProcedure):
+            names.setdefault((value.fn, value.use_env), name)
+    return names
+
+_names = None
+
+def _builtin_names():
+    """Return the names of the built-in primitives, computed once."""
+    global _names
+    if _names is None:
+        _names = _primitive_names(create_global_frame())
+    return _names
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, env):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.env = env
+        self.names = _builtin_names()
+        self.dispatch_table = {cls: _reduce_instance
+                               for cls in _CLASSES.values()}
+        self.dispatch_table[Pair] = _reduce_pair
+
+    def persistent_id(self, obj):
+        if obj is self.env:
+            return ('global',)
+        if type(obj) is PrimitiveProcedure:
+            name = self.names.get((obj.fn, obj.use_env))
+            if name is None:
+                raise SchemeError("cannot save an unnamed primitive procedure")
+            return ('primitive', name)
+        return None
+
+# The modules whose classes may be restored from an image, and the other
+# globals that rebuild Scheme values
+_MODULES = {'scheme', 'scheme_primitives', 'scheme_reader', 'scheme_tokens',
+            'scheme_memo', 'scheme_hashtables', 'scheme_records',
+            'scheme_parallel'}
+_GLOBALS = {('scheme_snapshot', '_new_instance'),
+            ('scheme_snapshot', '_rebuild_stream'),
+            ('scheme_records', '_rebuild_record'),
+            ('scheme_records', '_rebuild_record_type'),
+            ('scheme_reader', 'nil'), ('scheme_primitives', 'okay'),
+            ('collections', 'OrderedDict')}
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, env):
+        super().__init__(file)
+        self.env = env
+        self.primitives = dict(env.bindings)
+
+    def find_class(self, module, name):
+        """Return the class or function NAME of MODULE if it rebuilds Scheme
+        values, so that an image cannot run arbitrary code."""
+        if (module, name) in _GLOBALS:
+            return super().find_class(module, name)
+        if module in _MODULES and '.' not in name:
+            obj = super().find_class(module, name)
+            if isinstance(obj, type) and obj.__module__ == module:
+                return obj
+        raise pickle.UnpicklingError("{0}.{1} is not a Scheme value".format(
+            module, name))
+
+    def persistent_load(self, pid):
+        if pid == ('global',):
+            return self.env
+        if type(pid) is not tuple or len(pid) != 2:
+            raise pickle.UnpicklingError("unknown reference: {0}".format(pid))
+        kind, name = pid
+        if kind != 'primitive' or name not in self.primitives:
+            raise pickle.UnpicklingError("unknown primitive: {0}".format(name))
+        return self.primitives[name]
+
+def dumps(value, env):
+    """Return the Scheme VALUE pickled as bytes, storing the global frame ENV
+    and the primitives by reference, or raise a SchemeError."""
+    data = io.BytesIO()
+    try:
+        _Pickler(data, env).dump(value)
+    except (pickle.PicklingError, TypeError, AttributeError,
+            RecursionError) as exc:
+        raise SchemeError(str(exc))
+    return data.getvalue()
+
+def loads(data, env):
+    """Return the value pickled as the bytes DATA by dumps, resolving
+    references to the global frame and primitives against ENV."""
+    return _Unpickler(io.BytesIO(data), env).load()
+
+def save_image(env, filename):
+    """Save the bindings of the global frame ENV to the image file FILENAME."""
+    try:
+        data = dumps(env.bindings, env)
+    except SchemeError as exc:
+        raise SchemeError("cannot save image: {0}".format(exc))
+    with open(filename, 'wb') as outfile:
+        outfile.write(IMAGE_MAGIC + bytes([IMAGE_VERSION]))
+        outfile.write(data)
+
+def load_image(filename):
+    """Return a new global frame with the bindings saved in the image file
+    FILENAME.
+
+    >>> import os, tempfile
+    >>> env = create_global_frame()
+    >>> for line in ["(define (f . xs) (cons g xs))", "(define g car)",
+    ...              "(define data (list 'a (vector 1 2)))",
+    ...              "(define (ints n) (cons-stream n (ints (+ n 1))))",
+    ...              "(define s (ints 0))", "(stream-ref s 5000)"]:
+    ...     _ = scheme_eval(read_line(line), env)
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'lib.img')
+    >>> save_image(env, filename)
+    >>> restored = load_image(filename)
+    >>> f = restored.lookup('f')
+    >>> f.env is restored, restored.lookup('g') is env.lookup('car')
+    (True, True)
+    >>> print(scheme_eval(read_line("(f 1 2)"), restored))
+    (#[primitive] 1 2)
+    >>> print(restored.lookup('data'))
+    (a #(1 2))
+    >>> scheme_eval(read_line("(stream-ref s 4000)"), restored)
+    4000
+    >>> class Exploit:
+    ...     def __reduce__(self):
+    ...         return (os.system, ('echo pwned',))
+    >>> with open(filename, 'wb') as outfile:
+    ...     _ = outfile.write(IMAGE_MAGIC + bytes([IMAGE_VERSION]) +
+    ...                       pickle.dumps(Exploit()))
+    >>> load_image(filename) # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+        ...
+    scheme_primitives.SchemeError: cannot load image ...system is not a Scheme value
+    """
+    env = create_global_frame()
+    with open(filename, 'rb') as infile:
+        header = infile.read(len(IMAGE_MAGIC) + 1)
+        if header != IMAGE_MAGIC + bytes([IMAGE_VERSION]):
+            raise SchemeError("{0} is not a current image file".format(filename))
+        try:
+            bindings = _Unpickler(infile, env).load()
+        except (pickle.UnpicklingError, EOFError, AttributeError,
+                ImportError, KeyError, ValueError) as exc:
+            raise SchemeError("cannot load image {0}: {1}".format(filename, exc))
+    env.bindings.update(bindings)
+    return env
+
+##
+## Image primitives (non-standard)
+##
+
+@primitive("save-image", use_env=True)
+def scheme_save_image(filename, env):
+    """Save the global environment to the image file FILENAME."""
+    filename = check_filename(filename, 0, "save-image")
+    try:
+        save_image(env.global_frame(), filename)
+    except IOError as exc:
+        raise SchemeError(str(exc))
+    return okay
@@ -0,0 +1,218 @@
+"""This module implements the most used procedures of the Scheme standard
+library as primitives, in place of their definitions in scheme_lib.scm.
+
+Each loops in Python and calls back into Scheme procedures with scheme_apply,
+instead of interpreting a chain of helper procedures for every element.  Like
+all primitives, they are bound in the global frame and can be redefined.
+
+Primitives that call back into Scheme take the environment as their final
+argument, so the variadic ones separate it from their other arguments.
+"""
+
+from scheme import *
+
+def _items(lst, k, name):
+    """Return a Python list of the elements of the Scheme list LST, which is
+    argument K of NAME."""
+    items = []
+    while isinstance(lst, Pair):
+        if type(lst) is ArrayList:
+            items.extend(lst.elements())
+            lst = lst.tail
+        else:
+            items.append(lst.first)
+            lst = lst.second
+    if lst is not nil:
+        raise SchemeError("argument {0} of {1} is not a list".format(k, name))
+    return items
+
+def _columns(lists, name):
+    """Return the rows of elements of the Scheme lists LISTS, arguments 1 and
+    up of NAME, stopping at the end of the shortest."""
+    return zip(*[_items(lst, k + 1, name) for k, lst in enumerate(lists)])
+
+def _to_list(items, tail=nil):
+    result = tail
+    for item in reversed(items):
+        result = Pair(item, result)
+    return result
+
+##
+## Lists
+##
+
+@primitive("map", use_env=True)
+def scheme_map(f, lst, *rest):
+    """Apply F to the elements of LST and of any further lists, elementwise,
+    stopping at the end of the shortest list.
+
+    >>> env = create_global_frame()
+    >>> print(scheme_eval(read_line("(map + '(1 2 3) '(10 20))"), env))
+    (11 22)
+    """
+    *lists, env = rest
+    if not lists:
+        return _to_list([scheme_call1(f, x, env) for x in _items(lst, 1, "map")])
+    rows = _columns([lst] + lists, "map")
+    return _to_list([scheme_call(f, row, env) for row in rows])
+
+@primitive("for-each", use_env=True)
+def scheme_for_each(f, lst, *rest):
+    """Apply F to the elements of LST and of any further lists, elementwise,
+    for effect."""
+    *lists, env = rest
+    for row in _columns([lst] + lists, "for-each"):
+        scheme_call(f, row, env)
+    return okay
+
+@primitive("fold-left", use_env=True)
+def scheme_fold_left(kons, knil, lst, *rest):
+    """Combine the elements of LST and any further lists from left to right,
+    calling (KONS element ... accumulator) starting with KNIL.
+
+    >>> env = create_global_frame()
+    >>> print(scheme_eval(read_line("(fold-left cons '() '(1 2 3))"), env))
+    (3 2 1)
+    """
+    *lists, env = rest
+    result = knil
+    if not lists:
+        for x in _items(lst, 2, "fold-left"):
+            result = scheme_call2(kons, x, result, env)
+    else:
+        for row in _columns([lst] + lists, "fold-left"):
+            result = scheme_call(kons, row + (result,), env)
+    return result
+
+@primitive("fold-right", use_env=True)
+def scheme_fold_right(kons, knil, lst, *rest):
+    """Combine the elements of LST and any further lists from right to left,
+    calling (KONS element ... accumulator) starting with KNIL.
+
+    >>> env = create_global_frame()
+    >>> print(scheme_eval(read_line("(fold-right list 0 '(1 2) '(3 4))"), env))
+    (1 3 (2 4 0))
+    """
+    *lists, env = rest
+    result = knil
+    if not lists:
+        for x in reversed(_items(lst, 2, "fold-right")):
+            result = scheme_call2(kons, x, result, env)
+    else:
+        for row in reversed(list(_columns([lst] + lists, "fold-right"))):
+            result = scheme_call(kons, row + (result,), env)
+    return result
+
+@primitive("reduce", use_env=True)
+def scheme_reduce(f, lst, env):
+    """Fold the elements of the non-empty list LST from the left with F,
+    starting with the first."""
+    check_type(lst, scheme_pairp, 1, "reduce")
+    result = lst.first
+    for x in _items(lst.second, 1, "reduce"):
+        result = scheme_call2(f, x, result, env)
+    return result
+
+@primitive("filter", use_env=True)
+def scheme_filter(f, lst, env):
+    """Return a list of the elements of LST for which F is true."""
+    items = _items(lst, 1, "filter")
+    return _to_list([x for x in items if scheme_true(scheme_call1(f, x, env))])
+
+@primitive("find-tail", use_env=True)
+def scheme_find_tail(pred, lst, env):
+    """Return the first pair of LST whose car satisfies PRED, or false."""
+    while isinstance(lst, Pair):
+        if scheme_true(scheme_call1(pred, lst.first, env)):
+            return lst
+        lst = lst.second
+    if lst is not nil:
+        raise SchemeError("argument 1 of find-tail is not a list")
+    return False
+
+@primitive("find", use_env=True)
+def scheme_find(pred, lst, env):
+    """Return the first element of LST that satisfies PRED, or false."""
+    tail = scheme_find_tail(pred, lst, env)
+    return tail.first if tail is not False else False
+
+@primitive("cons*")
+def scheme_cons_star(first, *rest):
+    """Return a list of the arguments, whose last argument is its tail.
+
+    >>> print(scheme_cons_star(1, 2, Pair(3, nil)))
+    (1 2 3)
+    """
+    if not rest:
+        return first
+    return _to_list((first,) + rest[:-1], rest[-1])
+
+@primitive("take")
+def scheme_take(lst, k):
+    """Return a list of the first K elements of LST."""
+    check_type(k, scheme_integerp, 1, "take")
+    items = []
+    for _ in range(k):
+        check_type(lst, scheme_pairp, 0, "take")
+        items.append(lst.first)
+        lst = lst.second
+    return _to_list(items)
+
+@primitive("drop")
+def scheme_drop(lst, k):
+    """Return LST without its first K elements."""
+    check_type(k, scheme_integerp, 1, "drop")
+    for _ in range(k):
+        check_type(lst, scheme_pairp, 0, "drop")
+        lst = lst.second
+    return lst
+
+##
+## Numbers
+##
+
+@primitive("min")
+def scheme_min(x, *xs):
+    """Return the least of the numbers X and XS, the first if tied."""
+    result = x
+    for val in xs:
+        if scheme_lt(val, result):
+            result = val
+    return result
+
+@primitive("max")
+def scheme_max(x, *xs):
+    """Return the greatest of the numbers X and XS, the first if tied."""
+    result = x
+    for val in xs:
+        if scheme_gt(val, result):
+            result = val
+    return result
+
+##
+## Vectors
+##
+
+@primitive("vector-map!", use_env=True)
+def scheme_vector_map_bang(f, vec, *rest):
+    """Replace each element of VEC with F applied to it and the elements at
+    the same index of any further vectors, and return VEC."""
+    *vecs, env = rest
+    vecs = [vec] + vecs
+    for k in range(scheme_vector_length(vec)):
+        for v in vecs:
+            check_bounds(v, k)
+        vec[k] = scheme_call(f, [v[k] for v in vecs], env)
+    return vec
+
+@primitive("vector-map", use_env=True)
+def scheme_vector_map(f, vec, *rest):
+    """Return a new vector of F applied to the elements of VEC and of any
+    further vectors at each index.
+
+    >>> env = create_global_frame()
+    >>> print(scheme_eval(read_line("(vector-map * (vector 1 2) (vector 3 4))"),
+    ...                   env))
+    #(3 8)
+    """
+    return scheme_vector_map_bang(f, scheme_vector_copy(vec), *rest)
@@ -0,0 +1,194 @@
+"""This module implements promises and streams as primitives, in the style of
+SRFI 41.
+
+A stream is either nil or a pair whose second element is a promise of the
+rest of the stream, as made by (cons-stream first rest).  The procedures here
+build their results lazily, one element each time the rest is forced, and
+loop in Python instead of recursing, so that pipelines of them run without
+building whole lists or growing the Python stack.
+"""
+
+from scheme import *
+
+def _force(value):
+    return value.force() if isinstance(value, Promise) else value
+
+def _check_stream(stream, k, name):
+    if stream is not nil and not scheme_stream_pairp(stream):
+        msg = "argument {0} of {1} is not a stream"
+        raise SchemeError(msg.format(k, name))
+    return stream
+
+def _rest(stream):
+    """Return the rest of the stream pair STREAM."""
+    return stream.second.force()
+
+def _lazy(fn, *args):
+    """Return a promise to call FN on ARGS."""
+    return Promise((fn,) + args, None)
+
+@primitive("force")
+def scheme_force(value):
+    """Return the value of the promise VALUE, or VALUE if it is not one."""
+    return _force(value)
+
+@primitive("make-promise")
+def scheme_make_promise(value):
+    """Return a promise that is already forced to VALUE."""
+    if isinstance(value, Promise):
+        return value
+    promise = Promise(None, None)
+    promise.value, promise.forced = value, True
+    return promise
+
+@primitive("promise?")
+def scheme_promisep(x):
+    return isinstance(x, Promise)
+
+@primitive("stream-pair?")
+def scheme_stream_pairp(x):
+    return isinstance(x, Pair) and isinstance(x.second, Promise)
+
+@primitive("stream-null?")
+def scheme_stream_nullp(x):
+    return x is nil
+
+@primitive("stream-car")
+def scheme_stream_car(stream):
+    check_type(stream, scheme_stream_pairp, 0, "stream-car")
+    return stream.first
+
+@primitive("stream-cdr")
+def scheme_stream_cdr(stream):
+    check_type(stream, scheme_stream_pairp, 0, "stream-cdr")
+    return _rest(stream)
+
+@primitive("list->stream")
+def scheme_list_to_stream(lst):
+    """Return a stream of the elements of the list LST."""
+    check_type(lst, scheme_listp, 0, "list->stream")
+    result = nil
+    for item in reversed(list(lst)):
+        result = Pair(item, scheme_make_promise(result))
+    return result
+
+@primitive("stream->list")
+def scheme_stream_to_list(*args):
+    """Return a list of the elements of a finite stream, given as the last
+    argument, or of at most N of them if N is given first.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line(
+    ...     "(define (ints n) (cons-stream n (ints (+ n 1))))"), env)
+    >>> print(scheme_eval(read_line("(stream->list 3 (ints 1))"), env))
+    (1 2 3)
+    """
+    if len(args) == 2:
+        n, stream = args
+        check_type(n, scheme_integerp, 0, "stream->list")
+    else:
+        (stream,), n = args, None
+    items = []
+    while stream is not nil and (n is None or len(items) < n):
+        _check_stream(stream, len(args) - 1, "stream->list")
+        items.append(stream.first)
+        stream = _rest(stream)
+    return scheme_list(*items)
+
+@primitive("stream-ref")
+def scheme_stream_ref(stream, k):
+    """Return element K of STREAM, counting from 0."""
+    check_type(k, scheme_integerp, 1, "stream-ref")
+    stream = scheme_stream_drop(k, stream)
+    check_type(stream, scheme_stream_pairp, 0, "stream-ref")
+    return stream.first
+
+@primitive("stream-drop")
+def scheme_stream_drop(k, stream):
+    """Return STREAM without its first K elements."""
+    check_type(k, scheme_integerp, 0, "stream-drop")
+    for _ in range(k):
+        if stream is nil:
+            break
+        _check_stream(stream, 1, "stream-drop")
+        stream = _rest(stream)
+    return stream
+
+@primitive("stream-take")
+def scheme_stream_take(k, stream):
+    """Return a stream of the first K elements of STREAM."""
+    check_type(k, scheme_integerp, 0, "stream-take")
+    if k <= 0 or _check_stream(stream, 1, "stream-take") is nil:
+        return nil
+    return Pair(stream.first, _lazy(_take_rest, k - 1, stream))
+
+def _take_rest(k, stream):
+    return scheme_stream_take(k, _rest(stream))
+
+@primitive("stream-map", use_env=True)
+def scheme_stream_map(f, stream, *rest):
+    """Return a stream of the results of applying F to the elements of STREAM
+    and of any further streams, elementwise, ending with the shortest.
+
+    >>> env = create_global_frame()
+    >>> _ = scheme_eval(read_line(
+    ...     "(define (ints n) (cons-stream n (ints (+ n 1))))"), env)
+    >>> print(scheme_eval(read_line(
+    ...     "(stream->list 3 (stream-map * (ints 1) (ints 10)))"), env))
+    (10 22 36)
+    """
+    *streams, env = rest
+    streams = [stream] + streams
+    for k, stream in enumerate(streams):
+        if _check_stream(stream, k + 1, "stream-map") is nil:
+            return nil
+    first = scheme_call(f, [stream.first for stream in streams], env)
+    return Pair(first, _lazy(_map_rest, f, streams, env))
+
+def _map_rest(f, streams, env):
+    return scheme_stream_map(f, *[_rest(stream) for stream in streams], env)
+
+@primitive("stream-filter", use_env=True)
+def scheme_stream_filter(pred, stream, env):
+    """Return a stream of the elements of STREAM that satisfy PRED."""
+    while _check_stream(stream, 1, "stream-filter") is not nil:
+        if scheme_true(scheme_call1(pred, stream.first, env)):
+            return Pair(stream.first, _lazy(_filter_rest, pred, stream, env))
+        stream = _rest(stream)
+    return nil
+
+def _filter_rest(pred, stream, env):
+    return scheme_stream_filter(pred, _rest(stream), env)
+
+@primitive("stream-for-each", use_env=True)
+def scheme_stream_for_each(f, stream, *rest):
+    """Apply F to the elements of STREAM and of any further streams,
+    elementwise, for effect, until the shortest ends."""
+    *streams, env = rest
+    streams = [stream] + streams
+    while True:
+        for k, stream in enumerate(streams):
+            if _check_stream(stream, k + 1, "stream-for-each") is nil:
+                return okay
+        scheme_call(f, [stream.first for stream in streams], env)
+        streams = [_rest(stream) for stream in streams]
+
+@primitive("coordinate-stream")
+def scheme_coordinate_stream(width, height):
+    """Return a stream of the pixel coordinates (x y) of a WIDTH by HEIGHT
+    image in scanline order, for rendering with stream-for-each.
+
+    >>> print(scheme_stream_to_list(scheme_coordinate_stream(2, 2)))
+    ((0 0) (1 0) (0 1) (1 1))
+    """
+    check_type(width, scheme_integerp, 0, "coordinate-stream")
+    check_type(height, scheme_integerp, 1, "coordinate-stream")
+    return _coordinates(0, 0, width, height)
+
+def _coordinates(x, y, width, height):
+    if x == width:
+        x, y = 0, y + 1
+    if y >= height or width <= 0:
+        return nil
+    rest = _lazy(_coordinates, x + 1, y, width, height)
+    return Pair(scheme_list(x, y), rest)
@@ -1,117 +1,332 @@
 """The scheme_tokens module provides functions tokenize_line and tokenize_lines
 for converting (iterators producing) strings into (iterators producing) lists
-of tokens.  A token may be:
+of tokens, and classes TextTokenizer and LineTokenizer that scan a whole
+source file.  A token may be:
 
   * A number (represented as an int or float)
   * A boolean (represented as a bool)
-  * A symbol (represented as a string)
-  * A delimiter, including parentheses, dots, and single quotes
+  * A symbol (represented as a Symbol, an interned subclass of str)
+  * A string (represented as a SchemeString)
+  * A keyword such as #:capacity (represented as a Keyword)
+  * A delimiter, including parentheses, dots, and single quotes (represented
+    as a str)
+
+Tokens are recognized by a single compiled regular expression, so each line
+is scanned in one pass instead of character by character.
 
 This file also includes some features of Scheme that have not been addressed
 in the course, such as quasiquoting and Scheme strings.
 """
 
 from ucb import main
+import ast
+import functools
 import itertools
+import re
 import string
 import sys
-import tokenize
+import warnings
+
+class Symbol(str):
+    """A Scheme symbol.  Symbols are interned, so there is one Symbol for each
+    name, and they compare equal to Python strings with the same name.
+
+    >>> Symbol('lambda') is Symbol('lambda')
+    True
+    >>> Symbol('lambda') == 'lambda'
+    True
+    """
+    __slots__ = ()
+    _table = {}
+
+    def __new__(cls, name):
+        symbol = cls._table.get(name)
+        if symbol is None:
+            symbol = cls._table[name] = super().__new__(cls, name)
+        return symbol
+
+    def __reduce__(self):
+        return (Symbol, (str(self),))
+
+class Keyword(str):
+    """A keyword, such as #:capacity, which names an optional argument.
+    Keywords are interned and evaluate to themselves."""
+    __slots__ = ()
+    _table = {}
+
+    def __new__(cls, text):
+        keyword = cls._table.get(text)
+        if keyword is None:
+            keyword = cls._table[text] = super().__new__(cls, text)
+        return keyword
+
+    def __reduce__(self):
+        return (Keyword, (str(self),))
+
+_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n', '\t': '\\t',
+                          '\r': '\\r'})
+
+class SchemeString:
+    """A Scheme string, whose characters are the Python string VALUE.
+
+    >>> s = SchemeString('say "hi"')
+    >>> print(s)
+    "say \\"hi\\""
+    >>> s == SchemeString('say "hi"'), s == 'say "hi"'
+    (True, False)
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is SchemeString and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return 'SchemeString({0!r})'.format(self.value)
+
+    def __str__(self):
+        return '"' + self.value.translate(_ESCAPES) + '"'
+
+def _string(token):
+    """The SchemeString for the string literal TOKEN, whose escapes are those
+    of Python string literals."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return SchemeString(ast.literal_eval(token))
+    except (SyntaxError, ValueError):
+        raise ValueError("invalid string: {0}".format(token))
 
 _NUMERAL_STARTS = set(string.digits) | set('+-.')
 _SYMBOL_CHARS = (set('!$%&*/:<=>?@^_~') | set(string.ascii_lowercase) |
                  set(string.ascii_uppercase) | _NUMERAL_STARTS)
-_STRING_DELIMS = set('"')
-_WHITESPACE = set(' \t\n\r')
 _SINGLE_CHAR_TOKENS = set("()[]'`")
-_TOKEN_END = _WHITESPACE | _SINGLE_CHAR_TOKENS | _STRING_DELIMS | {',', ',@'}
 DELIMITERS = _SINGLE_CHAR_TOKENS | {'.', ',', ',@'}
 
+# The master pattern of the scanner.  Each match skips leading whitespace and
+# then names the kind of the candidate token it finds; a run of characters up
+# to a token end is an atom (a number, symbol or boolean).
+_TOKEN_PATTERN = re.compile(r"""
+    [ \t\n\r]*
+    (?: ;[^\n]*
+      | (?P<string>"(?:[^"\\\n]|\\.)*")
+      | (?P<badstring>"[^\n]*)
+      | (?P<keyword>\#:[^ \t\n\r()\[\]'`",]+)
+      | (?P<punct>,@?|\#[^\n]?|[()\[\]'`])
+      | (?P<atom>[^ \t\n\r()\[\]'`",]+)
+    )
+""", re.VERBOSE)
+
+_DIGITS = r'\d(?:_?\d)*'
+_INTEGER = re.compile(r'[+-]?' + _DIGITS + '$')
+_FLOAT = re.compile(r'[+-]?(?:{0}\.(?:{0})?|\.{0}|{0})(?:[eE][+-]?{0})?$'
+                    .format(_DIGITS))
+_SPECIAL_FLOAT = re.compile(r'[+-](?:inf(?:inity)?|nan)$', re.IGNORECASE)
+_SYMBOL = re.compile(r'[!$%&*/:<=>?@^_~a-zA-Z0-9+.-]+$')
+
+# Punctuation tokens, by their text
+_PUNCTUATION = {c: c for c in _SINGLE_CHAR_TOKENS | {',', ',@'}}
+_PUNCTUATION.update({'[': '(', ']': ')', '#t': True, '#f': False})
+
 def valid_symbol(s):
     """Returns whether s is a well-formed symbol."""
-    if len(s) == 0:
+    return _SYMBOL.match(s) is not None
+
+@functools.lru_cache(maxsize=4096)
+def _atom(text):
+    """The token for TEXT, a maximal run of characters that are not token
+    ends, or None if it is not a valid token.  Raises a ValueError for a
+    malformed symbol.  The tokens of recently seen atoms are kept, so that
+    repeated names are interned without parsing them again."""
+    if text in DELIMITERS or text == 'nil':
+        return text
+    lower = text.lower()
+    if lower == 'true':
+        return True
+    if lower == 'false':
         return False
-    for c in s:
-        if c not in _SYMBOL_CHARS:
-            return False
-    return True
-
-def next_candidate_token(line, k):
-    """A tuple (tok, k'), where tok is the next substring of line at or
-    after position k that could be a token (assuming it passes a validity
-    check), and k' is the position in line following that token.  Returns
-    (None, len(line)) when there are no more tokens."""
-    while k < len(line):
-        c = line[k]
-        if c == ';':
-            return None, len(line)
-        elif c in _WHITESPACE:
-            k += 1
-        elif c in _SINGLE_CHAR_TOKENS:
-            if c == ']': c = ')'
-            if c == '[': c = '('
-            return c, k+1
-        elif c == '#':
-            return line[k:k+2], min(k+2, len(line))
-        elif c == ',': # Unquote; check for @
-            if k+1 < len(line) and line[k+1] == '@':
-                return ',@', k+2
-            return c, k+1
-        elif c in _STRING_DELIMS:
-            if k+1 < len(line) and line[k+1] == c: # No triple quotes in Scheme
-                return c+c, k+2
-            line_bytes = (bytes(line[k:], encoding='utf-8'),)
-            gen = tokenize.tokenize(iter(line_bytes).__next__)
-            next(gen) # Throw away encoding token
-            token = next(gen)
-            if token.type != tokenize.STRING:
-                raise ValueError("invalid string: {0}".format(token.string))
-            return token.string, token.end[1]+k
-        else:
-            j = k
-            while j < len(line) and line[j] not in _TOKEN_END:
-                j += 1
-            return line[k:j], min(j, len(line))
-    return None, len(line)
+    if text[0] not in _SYMBOL_CHARS:
+        return None
+    if text[0] in _NUMERAL_STARTS:
+        if _INTEGER.match(text):
+            return int(text)
+        if _FLOAT.match(text) or _SPECIAL_FLOAT.match(text):
+            return float(text)
+    if _SYMBOL.match(text):
+        return Symbol(lower)
+    raise ValueError("invalid numeral or symbol: {0}".format(text))
 
-def tokenize_line(line):
-    """The list of Scheme tokens on line.  Excludes comments and whitespace."""
+# The number of invalid token warnings printed so far
+warning_count = 0
+
+def _warn_invalid(text, line, i):
+    global warning_count
+    warning_count += 1
+    print("warning: invalid token: {0}".format(text), file=sys.stderr)
+    print("    ", line, file=sys.stderr)
+    print(" " * (i+3), "^", file=sys.stderr)
+
+def _invalid_keyword(token, column):
+    raise ValueError("invalid keyword: {0} (column {1})".format(token,
+                                                               column + 1))
+
+def _tokenize_span(text, start, end):
+    """The list of Scheme tokens in TEXT[START:END], scanned in one pass of
+    the master pattern."""
     result = []
-    text, i = next_candidate_token(line, 0)
-    while text is not None:
-        if text in DELIMITERS:
-            result.append(text)
-        elif text == '#t' or text.lower() == 'true':
-            result.append(True)
-        elif text == '#f' or text.lower() == 'false':
-            result.append(False)
-        elif text == 'nil':
-            result.append(text)
-        elif text[0] in _SYMBOL_CHARS:
-            number = False
-            if text[0] in _NUMERAL_STARTS:
-                try:
-                    result.append(int(text))
-                    number = True
-                except ValueError:
-                    try:
-                        result.append(float(text))
-                        number = True
-                    except ValueError:
-                        pass
-            if not number:
-                if valid_symbol(text):
-                    result.append(text.lower())
-                else:
-                    raise ValueError("invalid numeral or symbol: {0}".format(text))
-        elif text[0] in _STRING_DELIMS:
-            result.append(text)
+    for match in _TOKEN_PATTERN.finditer(text, start, end):
+        kind = match.lastgroup
+        if kind == 'atom':
+            token = match.group(kind)
+            value = _atom(token)
+            if value is not None:
+                result.append(value)
+                continue
+        elif kind == 'punct':
+            token = match.group(kind)
+            if token in _PUNCTUATION:
+                result.append(_PUNCTUATION[token])
+                continue
+            if token == '#:':
+                _invalid_keyword(token, match.start(kind) - start)
+        elif kind == 'string':
+            result.append(_string(match.group(kind)))
+            continue
+        elif kind == 'keyword':
+            token = match.group(kind)
+            if _SYMBOL.match(token, 2):
+                result.append(Keyword(token.lower()))
+                continue
+            _invalid_keyword(token, match.start(kind) - start)
+        elif kind == 'badstring':
+            raise ValueError("invalid string: {0}".format(match.group(kind)))
         else:
-            print("warning: invalid token: {0}".format(text), file=sys.stderr)
-            print("    ", line, file=sys.stderr)
-            print(" " * (i+3), "^", file=sys.stderr)
-        text, i = next_candidate_token(line, i)
+            continue
+        _warn_invalid(token, text[start:end], match.end() - start)
     return result
 
+def token_columns(text, start, end):
+    """The columns in TEXT[START:END], a line that tokenizes without errors,
+    at which its tokens start.
+
+    >>> token_columns('(f  "a b" 1.5) ; c', 0, 18)
+    [0, 1, 4, 10, 13]
+    """
+    columns = []
+    for match in _TOKEN_PATTERN.finditer(text, start, end):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        token = match.group(kind)
+        if (kind == 'string' or
+                kind == 'atom' and _atom(token) is not None or
+                kind == 'punct' and token in _PUNCTUATION or
+                kind == 'keyword' and _SYMBOL.match(token, 2)):
+            columns.append(match.start(kind) - start)
+    return columns
+
+def tokenize_line(line):
+    """The list of Scheme tokens on line.  Excludes comments and whitespace.
+
+    >>> tokenize_line("(f #:size 2)")
+    ['(', 'f', '#:size', 2, ')']
+    >>> tokenize_line("(f #:si{ze 2)")
+    Traceback (most recent call last):
+        ...
+    ValueError: invalid keyword: #:si{ze (column 4)
+    >>> tokenize_line("(f #: 2)")
+    Traceback (most recent call last):
+        ...
+    ValueError: invalid keyword: #: (column 4)
+    """
+    return _tokenize_span(line, 0, len(line))
+
+class TextTokenizer:
+    """An iterator over lists of Scheme tokens, one for each line of TEXT,
+    which may hold a whole file.  Excludes comments and whitespace.  A line
+    with a malformed token raises ValueError, after which iteration continues
+    with the next line; at the end of TEXT, it raises EOFError.  The
+    line_number attribute counts the lines returned so far, and the columns
+    method returns the columns of the tokens of the last one.
+
+    >>> lines = TextTokenizer("(define (f x) ; comment\\n  [+ x -1.5e3 #t])")
+    >>> next(lines), next(lines)
+    (['(', 'define', '(', 'f', 'x', ')'], ['(', '+', 'x', -1500.0, True, ')', ')'])
+    >>> lines.columns()
+    [2, 3, 5, 7, 14, 16, 17]
+    >>> next(lines)
+    Traceback (most recent call last):
+        ...
+    EOFError
+    >>> next(TextTokenizer('(display "a \\\\"quoted\\\\" string")'))
+    ['(', 'display', SchemeString('a "quoted" string'), ')']
+    >>> next(TextTokenizer('(memoize f #:capacity 10)'))
+    ['(', 'memoize', 'f', '#:capacity', 10, ')']
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.start = 0
+        self.line_number = 0
+        self.line = (text, 0, 0)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        text, start = self.text, self.start
+        if start >= len(text):
+            raise EOFError
+        end = text.find('\n', start)
+        if end < 0:
+            end = len(text)
+        self.start = end + 1
+        self.line_number += 1
+        self.line = (text, start, end)
+        return _tokenize_span(text, start, end)
+
+    def columns(self):
+        """The columns of the tokens of the line returned last."""
+        return token_columns(*self.line)
+
+class LineTokenizer:
+    """An iterator over lists of Scheme tokens, one for each line of the
+    iterable LINES, such as an open file, which is read one line at a time.
+    Like a TextTokenizer, it continues after a malformed line, raises
+    EOFError at the end, and has line_number and columns.
+
+    >>> import io
+    >>> lines = LineTokenizer(io.StringIO("(+ 1\\n   2)\\n"))
+    >>> next(lines), next(lines), lines.line_number
+    (['(', '+', 1], [2, ')'], 2)
+    """
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.line_number = 0
+        self.line = ''
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            line = next(self.lines)
+        except StopIteration:
+            raise EOFError
+        self.line_number += 1
+        self.line = line.rstrip('\n')
+        return tokenize_line(self.line)
+
+    def columns(self):
+        """The columns of the tokens of the line returned last."""
+        return token_columns(self.line, 0, len(self.line))
+
 def tokenize_lines(input):
     """An iterator over lists of tokens, one for each line of the iterable
     input sequence."""